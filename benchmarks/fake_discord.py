@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+
+class FakeMessage:
+    def __init__(self, channel, content, embeds):
+        self.channel = channel
+        self.content = content
+        self.embeds = embeds or []
+
+
+class FakeChannel:
+    """
+    Records what the bot sends instead of talking to Discord.
+    `latency` adds a delay per send, roughly a Discord REST round trip.
+    """
+    def __init__(self, channel_id, latency=0.0):
+        self.id = channel_id
+        self.latency = latency
+        self.sent = []
+        self.send_times = []
+
+    async def send(self, content=None, embeds=None, embed=None, **kwargs):
+        start = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = FakeMessage(self, content, embeds or ([embed] if embed else []))
+        self.sent.append(message)
+        self.send_times.append(time.perf_counter() - start)
+        return message
+
+    def lines(self):
+        # Notification lines delivered, whether as plain content or inside digest embeds
+        count = 0
+        for message in self.sent:
+            if message.embeds:
+                count += sum(len(embed.description.split('\n')) for embed in message.embeds)
+            elif message.content:
+                count += 1
+        return count
+
+
+class FakeBot:
+    """
+    The part of commands.Bot the Events cog uses: the shared GitHub client,
+    channel lookup and cog lookup. It never becomes ready, so the cog's
+    background loops stay idle and the benchmark drives them itself.
+    """
+    def __init__(self, gh_client, channels):
+        self.gh_client = gh_client
+        self.channels = {channel.id: channel for channel in channels}
+        self.cogs = {}
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+    async def wait_until_ready(self):
+        await asyncio.Event().wait()
@@ -0,0 +1,186 @@
+import asyncio
+import copy
+import itertools
+import json
+import random
+import time
+from aiohttp import web
+
+# The Events API keeps at most this many events per feed
+FEED_LIMIT = 300
+
+
+def _iso(timestamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+
+
+class FakeGitHub:
+    """
+    Local stand-in for the parts of the GitHub REST API the poller uses:
+    `/repos/{owner}/{name}/events` and `/orgs/{org}/events`.
+
+    Each repo holds a feed of events, newest first, served like GitHub does:
+    `per_page`/`page` pagination with `Link` headers, a 300 event cap, an `ETag`
+    per feed state answered with 304 on `If-None-Match`, `X-Poll-Interval` and
+    `X-RateLimit-*` headers counting down a budget. `advance()` adds new events,
+    generated from a seed or copied from recorded Events API pages.
+    """
+    def __init__(self, org, repos, logins, rate_limit=5000, poll_interval=60, latency=0.0,
+                 recorded=None, seed=0):
+        self.org = org
+        self.repos = list(repos) # "owner/name"
+        self.logins = list(logins)
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset_at = int(time.time()) + 3600
+        self.poll_interval = poll_interval
+        self.latency = latency
+        self.recorded = recorded or []
+        self.random = random.Random(seed)
+        self._ids = itertools.count(10 ** 10)
+        self._numbers = {repo: itertools.count(1) for repo in self.repos}
+        self.feeds = {repo.lower(): [] for repo in self.repos}
+        self.org_feed = []
+        self.requests = 0
+        self.not_modified = 0
+        self._runner = None
+
+    @classmethod
+    def load_recorded(cls, path):
+        # A JSON array of Events API events, e.g. a saved /repos/{owner}/{name}/events page
+        with open(path) as f:
+            return json.load(f)
+
+    def advance(self, events_per_repo, active_ratio=1.0):
+        """
+        Adds `events_per_repo` new events to a random `active_ratio` share of the repos.
+        Returns the number of events added.
+        """
+        active = self.random.sample(self.repos, max(1, int(len(self.repos) * active_ratio)))
+        added = 0
+        for repo in active:
+            feed = self.feeds[repo.lower()]
+            for _ in range(events_per_repo):
+                event = self._next_event(repo)
+                feed.insert(0, event)
+                self.org_feed.insert(0, event)
+                added += 1
+            del feed[FEED_LIMIT:]
+        del self.org_feed[FEED_LIMIT:]
+        return added
+
+    def _next_event(self, repo):
+        now = time.time()
+        event_id = str(next(self._ids))
+        if self.recorded:
+            event = copy.deepcopy(self.recorded[int(event_id) % len(self.recorded)])
+            event.update({'id': event_id, 'repo': {'name': repo}, 'created_at': _iso(now)})
+            return event
+
+        actor = self.random.choice(self.logins)
+        number = next(self._numbers[repo])
+        html_url = f"https://github.com/{repo}/issues/{number}"
+        kind = self.random.random()
+        if kind < 0.3:
+            etype, payload = 'IssuesEvent', {'action': 'opened', 'issue': self._issue(html_url, number, actor, now)}
+        elif kind < 0.5:
+            assignee = self.random.choice(self.logins)
+            issue = self._issue(html_url, number, actor, now, assignees=[assignee])
+            etype, payload = 'IssuesEvent', {'action': 'assigned', 'issue': issue, 'assignee': {'login': assignee}}
+        elif kind < 0.7:
+            etype, payload = 'PullRequestEvent', {'action': 'opened', 'pull_request': self._pr(repo, number, actor, now)}
+        elif kind < 0.85:
+            pr = self._pr(repo, number, actor, now, merged=self.random.random() < 0.8)
+            etype, payload = 'PullRequestEvent', {'action': 'closed', 'pull_request': pr}
+        else:
+            author = self.random.choice(self.logins)
+            etype, payload = 'PullRequestReviewEvent', {
+                'action': 'submitted',
+                'review': {'id': int(event_id), 'body': 'Looks good, a couple of nits inline.'},
+                'pull_request': self._pr(repo, number, author, now)
+            }
+        return {
+            'id': event_id,
+            'type': etype,
+            'actor': {'login': actor},
+            'repo': {'name': repo},
+            'payload': payload,
+            'public': True,
+            'created_at': _iso(now)
+        }
+
+    def _issue(self, html_url, number, author, now, assignees=()):
+        labels = [{'name': 'good first issue'}] if number % 3 == 0 else []
+        return {
+            'html_url': html_url, 'number': number, 'title': f"Issue {number}", 'state': 'open',
+            'user': {'login': author}, 'labels': labels, 'assignees': [{'login': a} for a in assignees],
+            'created_at': _iso(now), 'updated_at': _iso(now)
+        }
+
+    def _pr(self, repo, number, author, now, merged=None):
+        pr = {
+            'html_url': f"https://github.com/{repo}/pull/{number}", 'number': number,
+            'title': f"PR {number}", 'user': {'login': author}, 'updated_at': _iso(now)
+        }
+        if merged is not None:
+            pr.update({'state': 'closed', 'merged': merged, 'closed_at': _iso(now)})
+        return pr
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Starts serving and returns the base URL to use as the client's rest_url.
+        """
+        app = web.Application()
+        app.router.add_get('/repos/{owner}/{name}/events', self.repo_events)
+        app.router.add_get('/orgs/{org}/events', self.org_events)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def repo_events(self, request):
+        key = f"{request.match_info['owner']}/{request.match_info['name']}".lower()
+        if key not in self.feeds:
+            return web.json_response({'message': 'Not Found'}, status=404, headers=self._rate_headers())
+        return await self._serve_feed(request, key, self.feeds[key])
+
+    async def org_events(self, request):
+        return await self._serve_feed(request, f"org:{request.match_info['org'].lower()}", self.org_feed)
+
+    async def _serve_feed(self, request, key, feed):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        headers = self._rate_headers()
+        headers['X-Poll-Interval'] = str(self.poll_interval)
+        etag = f'W/"{key}-{feed[0]["id"] if feed else 0}"'
+        headers['ETag'] = etag
+        if request.headers.get('If-None-Match') == etag:
+            # Like GitHub, a 304 doesn't count against the rate limit
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+
+        self.remaining = max(self.remaining - 1, 0)
+        headers['X-RateLimit-Remaining'] = str(self.remaining)
+        per_page = int(request.query.get('per_page', 30))
+        page = int(request.query.get('page', 1))
+        start = (page - 1) * per_page
+        if start + per_page < len(feed):
+            headers['Link'] = f'<{request.url.with_query(per_page=per_page, page=page + 1)}>; rel="next"'
+        return web.json_response(feed[start:start + per_page], headers=headers)
+
+    def _rate_headers(self):
+        return {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(self.reset_at),
+            'X-RateLimit-Resource': 'core'
+        }
+
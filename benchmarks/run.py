@@ -0,0 +1,236 @@
+"""
+Offline end-to-end benchmark of the polling pipeline: Events.sync_events against a
+local fake GitHub API, with fake Discord channels and a seeded SQLite database.
+
+    python benchmarks/run.py --repos 500 --users 10000 --cycles 5
+
+Reports events/sec, cycle time, database round trips and SQL statements per event
+and peak memory
+(tracemalloc). With --json the results are saved; with --baseline they are compared
+against a saved run and the exit code is 1 if throughput or memory regressed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, HERE)
+
+import database
+import metrics
+from database import DB_SECONDS, run_write
+from github_client import AsyncGitHubClient
+from fake_github import FakeGitHub
+from fake_discord import FakeBot, FakeChannel
+from seed import seed_database
+
+# Stand-in for config.yaml, so a local config doesn't change what is measured
+BENCH_CONFIG = {
+    'scoring': {'points': {'pr_merged': 10, 'pr_reviewed': 5, 'issue_assigned': 2}},
+    'polling': {'concurrency': 10, 'min_interval': 60, 'max_interval': 1800},
+    'backfill': {'enabled': False}
+}
+
+
+def _make_all_due():
+    # Every repo is polled every cycle, whatever cadence the last cycle gave it
+    conn = database.get_connection()
+    conn.execute('UPDATE repos SET next_poll_at = 0')
+    conn.commit()
+
+
+class StatementCounter:
+    """
+    Counts the SQL statements SQLite runs on one connection, whichever function sent them.
+    Connections are per thread, so there is one counter per thread that uses the database.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement):
+        self.count += 1
+
+    def install(self):
+        database.get_connection().set_trace_callback(self)
+        return self
+
+
+async def _count_statements():
+    # The event loop's connection (reads) and the writer thread's (writes)
+    return [StatementCounter().install(), await run_write(lambda: StatementCounter().install())]
+
+
+async def _drain(outbound, timeout=60):
+    deadline = time.monotonic() + timeout
+    while outbound.total_depth() and time.monotonic() < deadline:
+        await asyncio.sleep(0.005)
+
+
+async def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix='gitcord-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    logins, repos, channel_ids = seed_database(
+        db_path, users=args.users, repos=args.repos, channels=args.channels,
+        subscriptions_per_repo=args.subscriptions, seed=args.seed
+    )
+    database.DB_PATH = db_path
+    database.init_db()
+    counters = []
+    if not args.no_metrics:
+        metrics.enable()
+        counters = await _count_statements()
+
+    # Imported late: the cog reads its config at import time
+    from cogs import events as events_module
+    events_module.config = BENCH_CONFIG
+
+    recorded = FakeGitHub.load_recorded(args.recorded) if args.recorded else None
+    github = FakeGitHub('bench-org', repos, logins, rate_limit=args.rate_limit,
+                        latency=args.github_latency, recorded=recorded, seed=args.seed)
+    base_url = await github.start()
+    gh_client = AsyncGitHubClient('bench-token', 'bench-org', pool_size=args.concurrency * 2)
+    gh_client.rest_url = base_url
+
+    channels = [FakeChannel(channel_id, latency=args.discord_latency) for channel_id in channel_ids]
+    bot = FakeBot(gh_client, channels)
+    cog = events_module.Events(bot)
+    bot.cogs['Events'] = cog
+    for loop in (cog.sync_events, cog.prune_processed, cog.flush_scores, cog.refresh_issues, cog.backfill_activity):
+        loop.cancel()
+    cog.poller.semaphore = asyncio.Semaphore(args.concurrency)
+    await cog.scores.recover()
+
+    # Cycle 0 fetches the initial feeds and sets up ETags and watermarks; not measured
+    github.advance(args.events_per_repo)
+    await cog.sync_events()
+    await _drain(cog.outbound)
+    await cog.scores.flush()
+
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+    cycles = []
+    for _ in range(args.cycles):
+        github.advance(args.events_per_repo, active_ratio=args.active_ratio)
+        await run_write(_make_all_due)
+        db_calls = DB_SECONDS.total_count()
+        statements = sum(counter.count for counter in counters)
+        requests = github.requests
+
+        start = time.perf_counter()
+        await cog.sync_events()
+        poll_time = time.perf_counter() - start
+        await _drain(cog.outbound)
+        await cog.scores.flush()
+        total_time = time.perf_counter() - start
+
+        events = cog.poller.last_cycle['events']
+        cycles.append({
+            'events': events,
+            'cycle_seconds': poll_time,
+            'with_sends_seconds': total_time,
+            'github_requests': github.requests - requests,
+            'db_round_trips': DB_SECONDS.total_count() - db_calls,
+            'sql_statements': sum(counter.count for counter in counters) - statements
+        })
+
+    peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+    tracemalloc.stop()
+
+    await cog.outbound.close()
+    await gh_client.close()
+    await github.stop()
+    database.close_db()
+
+    total_events = sum(c['events'] for c in cycles)
+    total_time = sum(c['with_sends_seconds'] for c in cycles)
+    return {
+        'params': {k: v for k, v in vars(args).items() if k not in ('json', 'baseline')},
+        'cycles': cycles,
+        'events_per_sec': total_events / total_time if total_time else 0,
+        'avg_cycle_seconds': sum(c['cycle_seconds'] for c in cycles) / len(cycles),
+        'db_round_trips_per_event': (sum(c['db_round_trips'] for c in cycles) / total_events
+                                     if total_events and not args.no_metrics else None),
+        'sql_statements_per_event': (sum(c['sql_statements'] for c in cycles) / total_events
+                                     if total_events and not args.no_metrics else None),
+        'peak_memory_bytes': peak,
+        'notifications_sent': sum(channel.lines() for channel in channels),
+        'github_304s': github.not_modified
+    }
+
+
+def report(results):
+    print(f"{'cycle':>5} {'events':>8} {'poll s':>8} {'+sends s':>9} {'requests':>9} {'db calls':>9} {'sql stmts':>10}")
+    for i, cycle in enumerate(results['cycles'], 1):
+        print(f"{i:>5} {cycle['events']:>8} {cycle['cycle_seconds']:>8.3f} {cycle['with_sends_seconds']:>9.3f} "
+              f"{cycle['github_requests']:>9} {cycle['db_round_trips']:>9} {cycle['sql_statements']:>10}")
+    print()
+    print(f"events/sec:               {results['events_per_sec']:.1f}")
+    print(f"avg cycle time:           {results['avg_cycle_seconds']:.3f}s")
+    if results['db_round_trips_per_event'] is not None:
+        print(f"DB round trips per event: {results['db_round_trips_per_event']:.2f}")
+    if results.get('sql_statements_per_event') is not None:
+        print(f"SQL statements per event: {results['sql_statements_per_event']:.2f}")
+    if results['peak_memory_bytes'] is not None:
+        print(f"peak memory (traced):     {results['peak_memory_bytes'] / 2 ** 20:.1f} MiB")
+    print(f"notifications sent:       {results['notifications_sent']}")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the regressions of `results` against a saved `baseline`, beyond `tolerance` (a ratio).
+    """
+    regressions = []
+    if results['events_per_sec'] < baseline['events_per_sec'] * (1 - tolerance):
+        regressions.append(f"events/sec {results['events_per_sec']:.1f} < baseline {baseline['events_per_sec']:.1f}")
+    for key in ('avg_cycle_seconds', 'db_round_trips_per_event', 'sql_statements_per_event', 'peak_memory_bytes'):
+        if results.get(key) is not None and baseline.get(key) and results[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key} {results[key]:.3g} > baseline {baseline[key]:.3g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the polling pipeline offline")
+    parser.add_argument('--repos', type=int, default=500)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--subscriptions', type=int, default=1, help="channels each repo is linked to")
+    parser.add_argument('--events-per-repo', type=int, default=5, help="new events per active repo per cycle")
+    parser.add_argument('--active-ratio', type=float, default=0.5, help="share of repos with new events per cycle")
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--rate-limit', type=int, default=5000)
+    parser.add_argument('--github-latency', type=float, default=0.0, help="seconds added to each fake GitHub response")
+    parser.add_argument('--discord-latency', type=float, default=0.0, help="seconds added to each fake channel.send")
+    parser.add_argument('--recorded', help="JSON array of recorded Events API events to replay instead of generated ones")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-metrics', action='store_true', help="don't count DB round trips or SQL statements (no instrumentation)")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="don't trace memory (faster, no peak memory)")
+    parser.add_argument('--json', help="save the results to this file")
+    parser.add_argument('--baseline', help="results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run_benchmark(args))
+    report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import database
+
+FIRST_DISCORD_ID = 100000000000000000
+FIRST_CHANNEL_ID = 900000000000000000
+
+
+def seed_database(path, users=1000, repos=100, channels=10, org='bench-org',
+                  subscriptions_per_repo=1, maintainers_per_repo=2, seed=0):
+    """
+    Creates a fresh bot database at `path` with the current schema and
+    `users` linked users, `repos` repos of `org` spread over `channels` channels,
+    and maintainers for each repo. Returns (logins, repo names, channel IDs).
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    previous, database.DB_PATH = database.DB_PATH, path
+    try:
+        database.init_db()
+        database.close_db()
+    finally:
+        database.DB_PATH = previous
+
+    rng = random.Random(seed)
+    logins = [f"user{i}" for i in range(users)]
+    repo_names = [f"{org}/repo{i}" for i in range(repos)]
+    channel_ids = [FIRST_CHANNEL_ID + i for i in range(channels)]
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            'INSERT INTO users (discord_id, github_username, github_login, score, last_synced_at) VALUES (?, ?, ?, ?, ?)',
+            [(FIRST_DISCORD_ID + i, login, login, rng.randint(0, 500), '2024-01-01T00:00:00Z')
+             for i, login in enumerate(logins)]
+        )
+        subscriptions = []
+        maintainers = set()
+        for i, repo in enumerate(repo_names):
+            owner, name = repo.split('/')
+            repo_url = f"https://github.com/{repo}"
+            for k in range(subscriptions_per_repo):
+                subscriptions.append((repo_url, owner, name, channel_ids[(i + k) % channels]))
+            for _ in range(min(maintainers_per_repo, users)):
+                maintainers.add((FIRST_DISCORD_ID + rng.randrange(users), repo_url))
+        conn.executemany('INSERT OR IGNORE INTO repos (repo_url, owner, name, channel_id) VALUES (?, ?, ?, ?)',
+                         subscriptions)
+        conn.executemany('INSERT OR IGNORE INTO maintainers (discord_id, repo_url) VALUES (?, ?)', maintainers)
+    conn.close()
+    return logins, repo_names, channel_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a seeded bot database for benchmarks")
+    parser.add_argument('path')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repos', type=int, default=100)
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--org', default='bench-org')
+    args = parser.parse_args()
+    seed_database(args.path, args.users, args.repos, args.channels, args.org)
+    print(f"Seeded {args.path}: {args.users} users, {args.repos} repos in {args.channels} channels")
+
+
+if __name__ == '__main__':
+    main()
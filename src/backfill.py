@@ -0,0 +1,156 @@
+import logging
+import time
+from database import EventBatch, get_users_to_backfill, commit_backfill_page, run_write
+from dedupe import event_key
+from event_records import EventRecord, Subject
+
+# GitHub rejects search queries longer than this
+MAX_QUERY_LENGTH = 256
+
+
+def _iso(timestamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+
+
+def _checkpoint(user, default_since):
+    # Rows linked before the backfill existed hold 'YYYY-MM-DD HH:MM:SS' (UTC)
+    synced = user['last_synced_at']
+    if not synced:
+        return default_since
+    return synced if 'T' in synced else synced.replace(' ', 'T') + 'Z'
+
+
+def pack_users(org, users, default_since):
+    """
+    Splits `users` (rows of the users table) into groups whose logins fit in one
+    search query as `involves:` qualifiers, checkpoints closest together first.
+    """
+    base_length = len(f"org:{org} updated:>=0000-00-00T00:00:00Z")
+    groups = []
+    group, length = [], base_length
+    for user in sorted(users, key=lambda u: _checkpoint(u, default_since)):
+        qualifier = len(f" involves:{user['github_login']}")
+        if group and length + qualifier > MAX_QUERY_LENGTH:
+            groups.append(group)
+            group, length = [], base_length
+        group.append(user)
+        length += qualifier
+    if group:
+        groups.append(group)
+    return groups
+
+
+class ActivityBackfill:
+    """
+    Scores the org activity linked users had before the bot saw it: PRs they merged
+    and issues assigned to them, found with the Search API. Like the live events,
+    a merge is credited to whoever merged the PR, and an assignment is dated when
+    it happened; search results carry neither, so each page's are looked up with
+    one GraphQL query (see get_activity_details()).
+
+    Several users share one query (`involves:` qualifiers up to the query length
+    limit), read oldest update first. After every page the awards are journalled
+    and the users' `last_synced_at` checkpoint moves to the last `updated_at` read,
+    in one transaction, so an interrupted run resumes where it stopped. Awards use
+    the same journal keys as the live events (see dedupe.event_key()), so activity
+    that was already scored, or is scored again later, is never counted twice.
+
+    Users start at `since` (their last_synced_at is NULL when they link) and are
+    synced again `resync_interval` seconds after they caught up, to pick up what
+    polling may have missed. Every request goes through the client's search budget
+    at background priority.
+    """
+    def __init__(self, gh_client, points, on_awards, since='2020-01-01T00:00:00Z',
+                 resync_interval=24 * 3600, max_users=100):
+        self.gh_client = gh_client
+        self.points = points
+        self.on_awards = on_awards # Gets each page's newly journalled awards
+        self.since = since
+        self.resync_interval = resync_interval
+        self.max_users = max_users
+        self.last_run = None
+
+    async def run(self):
+        """
+        Syncs up to `max_users` users that are due. Returns the number of awards journalled.
+        """
+        start = time.time()
+        users = [u for u in get_users_to_backfill(_iso(start - self.resync_interval), self.max_users)
+                 if u['github_login']]
+        awarded = 0
+        for group in pack_users(self.gh_client.org_name, users, self.since):
+            awarded += await self._sync_group(group)
+
+        self.last_run = {'users': len(users), 'awards': awarded, 'duration': time.time() - start}
+        if users:
+            logging.info(f"Backfill: {len(users)} users synced, {awarded} awards in {self.last_run['duration']:.2f}s")
+        return awarded
+
+    async def _sync_group(self, group):
+        # login -> (discord_id, checkpoint); the query starts at the group's oldest checkpoint
+        logins = {user['github_login']: (user['discord_id'], _checkpoint(user, self.since)) for user in group}
+        discord_ids = [discord_id for discord_id, _ in logins.values()]
+        since = min(checkpoint for _, checkpoint in logins.values())
+        started = _iso(time.time())
+        involves = ' '.join(f"involves:{login}" for login in logins)
+        awarded = 0
+
+        while True:
+            query = f"org:{self.gh_client.org_name} {involves} updated:>={since}"
+            seen, total, last = 0, 0, since
+            async for items, total in self.gh_client.search_issue_pages(query):
+                batch = EventBatch()
+                details = await self.gh_client.get_activity_details(
+                    [item for item in items if self._needs_details(item, logins)])
+                for item in items:
+                    self._award(item, logins, batch, details.get(item['html_url']))
+                if items:
+                    last = items[-1]['updated_at']
+                journalled = await run_write(commit_backfill_page, batch, discord_ids, last)
+                self.on_awards(journalled)
+                awarded += len(journalled)
+                seen += len(items)
+            if seen >= total or last == since:
+                break
+            # Past the 1000 results a query serves; carry on from the checkpoint
+            since = last
+
+        # Everything updated before the run started has been read
+        await run_write(commit_backfill_page, EventBatch(), discord_ids, started)
+        return awarded
+
+    def _user(self, logins, login, item):
+        # Only activity past the user's own checkpoint; older items were read before
+        discord_id, checkpoint = logins.get(login.lower(), (None, None))
+        if discord_id and item['updated_at'] >= checkpoint:
+            return discord_id
+        return None
+
+    def _needs_details(self, item, logins):
+        if 'pull_request' in item:
+            return bool((item['pull_request'] or {}).get('merged_at'))
+        return any(self._user(logins, assignee['login'], item) for assignee in item.get('assignees') or [])
+
+    def _award(self, item, logins, batch, details):
+        # Shaped like the events process_event() scores, so the journal keys and recipients match
+        if details is None:
+            return # Gone since the search, or nothing to score
+        if 'pull_request' in item:
+            merged_at = (item['pull_request'] or {}).get('merged_at')
+            discord_id = self._user(logins, details['merged_by'], item) if details['merged_by'] else None
+            if discord_id and merged_at:
+                event = EventRecord(None, 'PullRequestEvent', action='closed',
+                                    subject=Subject.from_api(item, is_pull_request=True))
+                batch.award(event_key(event), 'pr_merged', discord_id,
+                            self.points.get('pr_merged', 10), day=merged_at[:10])
+            return
+
+        for assignee in item.get('assignees') or []:
+            discord_id = self._user(logins, assignee['login'], item)
+            if discord_id:
+                event = EventRecord(None, 'IssuesEvent', action='assigned',
+                                    subject=Subject.from_api(item), target=assignee['login'])
+                # Assignments past the timeline's last 50 fall back to the latest update
+                assigned_at = details['assigned_at'].get(assignee['login'].lower(), item['updated_at'])
+                batch.award(event_key(event), 'issue_assigned', discord_id,
+                            self.points.get('issue_assigned', 0), day=assigned_at[:10])
@@ -1,8 +1,14 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from database import add_repo, remove_repo, add_maintainer, remove_maintainer, get_user_by_discord
+from database import (add_repo, remove_repo, add_maintainer, remove_maintainer, get_user_by_discord,
+                      count_indexed_issues, get_live_workers, count_outbox, run_write)
 import re
+import time
+import metrics
+from github_client import GITHUB_REQUEST_SECONDS
+from database import DB_SECONDS
+from outbound import SEND_SECONDS
 
 class Admin(commands.Cog):
     def __init__(self, bot):
@@ -32,7 +38,7 @@ class Admin(commands.Cog):
                 invalid.append(url)
                 continue
 
-            if add_repo(url, interaction.channel_id):
+            if await run_write(add_repo, url, interaction.channel_id):
                 added.append(url)
             else:
                 failed.append(url)
@@ -55,7 +61,7 @@ class Admin(commands.Cog):
     async def repo_remove(self, interaction: discord.Interaction, repo_url: str):
         """Remove a linked repository from this channel."""
         repo_url = repo_url.strip().rstrip('/')
-        if remove_repo(repo_url, interaction.channel_id):
+        if await run_write(remove_repo, repo_url, interaction.channel_id):
             await interaction.response.send_message(f"✅ Removed {repo_url}")
         else:
             await interaction.response.send_message(f"❌ Could not find {repo_url} linked to this channel.", ephemeral=True)
@@ -80,7 +86,7 @@ class Admin(commands.Cog):
              await interaction.response.send_message(f"❌ {user.mention} is not linked! They must use `/link` first.", ephemeral=True)
              return
 
-        if add_maintainer(user.id, repo_url):
+        if await run_write(add_maintainer, user.id, repo_url):
             await interaction.response.send_message(f"✅ Added {user.mention} as maintainer for {repo_url}")
         else:
             await interaction.response.send_message(f"❌ Failed. Check if they are already a maintainer or if the repo is valid.", ephemeral=True)
@@ -89,10 +95,128 @@ class Admin(commands.Cog):
     @app_commands.checks.has_permissions(administrator=True)
     async def maintainer_remove(self, interaction: discord.Interaction, user: discord.User, repo_url: str):
         repo_url = repo_url.strip().rstrip('/')
-        if remove_maintainer(user.id, repo_url):
+        if await run_write(remove_maintainer, user.id, repo_url):
             await interaction.response.send_message(f"✅ Removed {user.mention} from maintainers of {repo_url}")
         else:
              await interaction.response.send_message(f"❌ Failed to remove. Check repo URL and if they are a maintainer.", ephemeral=True)
 
+    # Group for score-based role commands
+    roles_group = app_commands.Group(name="roles", description="Manage score-based roles")
+
+    @roles_group.command(name="reconcile", description="Re-check every linked user's score-based role")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def roles_reconcile(self, interaction: discord.Interaction):
+        """Full recovery pass over all linked users; normally roles only change when a score crosses a threshold."""
+        events = self.bot.get_cog('Events')
+        if not events or not events.promotions:
+            await interaction.response.send_message("❌ Score-based roles are not configured (`roles.thresholds` and `discord.guild_id`).", ephemeral=True)
+            return
+
+        await interaction.response.send_message("⏳ Reconciling roles...", ephemeral=True)
+        before = events.promotions.applied
+        checked = await events.promotions.reconcile()
+        await interaction.edit_original_response(content=f"✅ Checked {checked} linked users, updated {events.promotions.applied - before}.")
+
+    # Group for task assignment commands
+    issues_group = app_commands.Group(name="issues", description="Match good first issues to contributors")
+
+    @issues_group.command(name="match", description="Suggest contributors for unassigned good first issues")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def issues_match(self, interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10,
+                           max_load: app_commands.Range[int, 1, 10] = 1):
+        """Pairs the oldest unassigned issues with the least busy, highest scoring linked contributors."""
+        events = self.bot.get_cog('Events')
+        if not events:
+            await interaction.response.send_message("❌ Event processing is not loaded.", ephemeral=True)
+            return
+
+        pairs = events.issue_index.match(max_load=max_load, limit=limit)
+        if not pairs:
+            await interaction.response.send_message("No unassigned issues or no available contributors right now.", ephemeral=True)
+            return
+
+        lines = [f"• {issue['html_url']} → <@{discord_id}>" for issue, discord_id in pairs]
+        await interaction.response.send_message("📋 Suggested assignments:\n" + "\n".join(lines))
+
+    @issues_group.command(name="refresh", description="Re-list every open good first issue from GitHub")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def issues_refresh(self, interaction: discord.Interaction):
+        events = self.bot.get_cog('Events')
+        if not events:
+            await interaction.response.send_message("❌ Event processing is not loaded.", ephemeral=True)
+            return
+
+        await interaction.response.send_message("⏳ Refreshing the issue index...", ephemeral=True)
+        try:
+            fetched = await events.issue_index.refresh(full=True)
+        except Exception as e:
+            await interaction.edit_original_response(content=f"❌ Failed to search GitHub: {e}")
+            return
+        await interaction.edit_original_response(content=f"✅ Fetched {fetched} issues, {count_indexed_issues()} open issues indexed.")
+
+    @app_commands.command(name="stats", description="Show polling, queue, rate-limit and latency stats")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def stats(self, interaction: discord.Interaction):
+        """Operational snapshot of the bot; latencies need `metrics.enabled` in config.yaml."""
+        events = self.bot.get_cog('Events')
+        embed = discord.Embed(title="📈 GitCord stats", color=discord.Color.blurple())
+
+        if events:
+            cycle = events.poller.last_cycle
+            embed.add_field(name="Last poll cycle", value=(
+                f"{cycle['repos']} repos ({cycle['subscriptions']} subscriptions), {cycle['events']} events, "
+                f"{cycle['failed']} failed in {cycle['duration']:.2f}s" if cycle else "No cycle yet"
+            ), inline=False)
+            if events.org_stream and events.org_stream.last_cycle:
+                org = events.org_stream.last_cycle
+                embed.add_field(name="Org stream", value=(
+                    f"{org['events']} events for {org['routed_repos']} repos, {org['new_events']} new in {org['duration']:.2f}s"
+                ), inline=False)
+
+            dedupe = events.dedupe.stats()
+            hit_rate = f"{dedupe['hit_rate']:.1%}" if dedupe['hit_rate'] is not None else "n/a"
+            embed.add_field(name="Dedupe", value=(
+                f"{dedupe['memory_size']} in memory / {dedupe['table_size']} stored, hit rate {hit_rate}"
+            ), inline=False)
+            embed.add_field(name="Outbound", value=(
+                f"{events.outbound.total_depth()} queued, {events.outbound.sent} sent, {events.outbound.dropped} dropped"
+            ), inline=False)
+            embed.add_field(name="Scores", value=f"{len(events.scores.pending())} users with unapplied points", inline=False)
+            if events.workers:
+                workers = get_live_workers(time.time() - events.worker_ttl)
+                embed.add_field(name="Ingestion workers", value=(
+                    f"{len(workers)} live ({', '.join(workers) or 'none'}), {count_outbox()} notifications in the outbox"
+                ), inline=False)
+
+        startup = getattr(self.bot, 'startup', {})
+        if 'ready' in startup:
+            sync = f"{startup['sync']:.2f}s" if startup['synced'] else "skipped (unchanged)"
+            embed.add_field(name="Startup", value=(
+                f"Ready in {startup['ready']:.2f}s: cogs {startup['cogs']:.2f}s, command sync {sync}"
+            ), inline=False)
+
+        limits = []
+        for resource, budget in self.bot.gh_client.scheduler.snapshot().items():
+            if budget['limit'] is None:
+                limits.append(f"`{resource}`: not used yet")
+                continue
+            resets = f", resets in {budget['resets_in']:.0f}s" if budget['resets_in'] is not None else ""
+            limits.append(f"`{resource}`: {budget['remaining']}/{budget['limit']}{resets}, {budget['waiting']} waiting")
+        embed.add_field(name="GitHub rate limits", value="\n".join(limits), inline=False)
+
+        if metrics.enabled:
+            lines = []
+            for label, histogram in (("GitHub request", GITHUB_REQUEST_SECONDS), ("DB call", DB_SECONDS),
+                                     ("Discord send", SEND_SECONDS)):
+                summary = histogram.summary()
+                if summary:
+                    lines.append(f"{label}: {summary['count']} calls, avg {summary['avg'] * 1000:.1f}ms, "
+                                 f"p95 ≤ {summary['p95'] * 1000:g}ms")
+            embed.add_field(name="Latency", value="\n".join(lines) or "Nothing measured yet", inline=False)
+        else:
+            embed.set_footer(text="Enable `metrics` in config.yaml for latency histograms.")
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(Admin(bot))
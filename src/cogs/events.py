@@ -1,153 +1,505 @@
 import discord
 from discord.ext import commands, tasks
-import yaml
-import os
 import random
+import time
 import logging
-from database import (get_repos, update_repo_etag, update_score, 
-                      get_discord_from_github, get_maintainers_for_repo,
-                      mark_event_processed, is_event_processed)
-from github_client import GitHubClient
-
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config.yaml')
-try:
-    with open(CONFIG_PATH, 'r') as f:
-        config = yaml.safe_load(f)
-except:
-    config = {'scoring': {'points': {}}}
+import asyncio
+from datetime import datetime, timezone
+import metrics
+from config import config
+from database import (get_due_repos, get_repos, resolve_discord_id, get_maintainer_set, mark_event_processed,
+                      EventBatch, commit_event_batch, run_write, get_outbox, delete_outbox)
+from dedupe import ProcessedEventFilter, event_key, subscription_key
+from poller import RepoPoller, OrgEventStream, group_subscriptions
+from webhooks import WebhookServer, webhook_to_event
+from outbound import OutboundQueue, retryable
+from scoring import ScoreAggregator
+from promotions import PromotionEngine
+from issue_index import IssueIndex
+from backfill import ActivityBackfill
+from partition import RepoPartition
+
+PROCESS_EVENT_SECONDS = metrics.Histogram('gitcord_process_event_seconds', 'process_event time per event and channel', ('type',))
+EVENTS_DELIVERED = metrics.Counter('gitcord_events_delivered_total', 'New events handled, once per event', ('type',))
+EVENT_LAG_SECONDS = metrics.Histogram(
+    'gitcord_event_lag_seconds', 'Time from an event on GitHub to the bot handling it',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 6 * 3600)
+)
+
+# (event type, action) -> Events method handling it, see handles()
+EVENT_HANDLERS = {}
+
+def handles(etype, *actions):
+    """
+    Registers the decorated Events method as the handler of `etype` events with one of `actions`.
+    process_event() finds it with one dict lookup, however many handlers there are.
+    """
+    def decorator(func):
+        for action in actions:
+            EVENT_HANDLERS[(etype, action)] = func
+        return func
+    return decorator
+
+class EventContext:
+    """
+    What a handler gets for one event delivered to one channel.
+    """
+    __slots__ = ('channel_id', 'event', 'batch', 'key', 'maintainers',
+                 'actor_mention', 'actor_id', 'actor_mapped', 'points')
+
+    def __init__(self, channel_id, event, batch, key, maintainers, actor_mention, actor_id, actor_mapped, points):
+        self.channel_id = channel_id
+        self.event = event
+        self.batch = batch
+        self.key = key
+        self.maintainers = maintainers
+        self.actor_mention = actor_mention
+        self.actor_id = actor_id
+        self.actor_mapped = actor_mapped
+        self.points = points
 
 class Events(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, worker_id=None):
         self.bot = bot
-        self.gh_client = GitHubClient(config['github']['token'], config['github']['organization'])
-        self.sync_events.start()
+        self.gh_client = bot.gh_client
+        # With ingestion.workers, polling runs in worker.py processes (each constructing this
+        # cog with its `worker_id`) and the bot process posts what they queue in the outbox
+        ingestion_conf = config.get('ingestion', {})
+        self.workers = ingestion_conf.get('workers', False)
+        self.worker_ttl = ingestion_conf.get('worker_ttl', 60)
+        self.partition = None
+        if worker_id:
+            self.partition = RepoPartition(worker_id, ttl=self.worker_ttl, grace=ingestion_conf.get('rebalance_grace', 30))
+        polling_conf = config.get('polling', {})
+        self.poller = RepoPoller(
+            self.gh_client,
+            concurrency=polling_conf.get('concurrency', 10),
+            min_interval=polling_conf.get('min_interval', 60),
+            max_interval=polling_conf.get('max_interval', 1800)
+        )
+        # An event that keeps failing (a handler bug, a bad payload) is skipped after this many tries
+        self.max_event_attempts = polling_conf.get('max_event_attempts', 5)
+        self._event_failures = {} # subscription key -> failed attempts so far
+        # Optional: one org-wide feed for every repo of the org, per-repo polling for the rest
+        self.org_stream = None
+        if polling_conf.get('org_stream', False):
+            self.org_stream = OrgEventStream(
+                self.gh_client,
+                min_interval=polling_conf.get('min_interval', 60),
+                max_interval=polling_conf.get('org_stream_max_interval', 300),
+                seen_ttl=polling_conf.get('org_stream_seen_ttl', 3600)
+            )
+        dedupe_conf = config.get('dedupe', {})
+        self.dedupe = ProcessedEventFilter(
+            capacity=dedupe_conf.get('memory_capacity', 100000),
+            retention=dedupe_conf.get('retention_days', 90) * 24 * 3600,
+            shared=self.workers or self.partition is not None
+        )
+        self.dedupe.load()
+        self.scores = ScoreAggregator()
+        # Score-based roles, only for users whose score changed in a flush
+        self.promotions = None
+        roles_conf = config.get('roles', {})
+        if roles_conf.get('thresholds') and config.get('discord', {}).get('guild_id') and not self.partition:
+            self.promotions = PromotionEngine(
+                bot,
+                int(config['discord']['guild_id']),
+                roles_conf['thresholds'],
+                interval=roles_conf.get('edit_interval', 1.0)
+            )
+        # Open labeled issues across the org, for task assignment
+        issues_conf = config.get('issues', {})
+        self.issue_index = IssueIndex(
+            self.gh_client,
+            label=issues_conf.get('label', 'good first issue'),
+            full_interval=issues_conf.get('full_refresh_hours', 24) * 3600
+        )
+        # Historical activity of linked users, scored through the same journal as live events
+        backfill_conf = config.get('backfill', {})
+        since = str(backfill_conf.get('since', '2020-01-01'))
+        self.backfill = ActivityBackfill(
+            self.gh_client,
+            config['scoring']['points'],
+            self.scores.add,
+            since=since if 'T' in since else f"{since}T00:00:00Z",
+            resync_interval=backfill_conf.get('resync_hours', 24) * 3600,
+            max_users=backfill_conf.get('max_users_per_run', 100)
+        )
+        # Notifications are sent by per-channel senders, coalesced per cycle
+        self.outbound = OutboundQueue(bot)
+
+        # Optional push-based intake; polling keeps running as the reconciliation fallback
+        self.webhook_server = None
+        self._inflight_deliveries = set()
+        self._repo_locks = {}
+        self._webhook_tasks = set()
+        webhook_conf = config.get('webhooks', {})
+        if webhook_conf.get('enabled', False) and not self.partition:
+            self.webhook_server = WebhookServer(
+                webhook_conf['secret'],
+                self._on_webhook_delivery,
+                host=webhook_conf.get('host', '127.0.0.1'),
+                port=webhook_conf.get('port', 8080),
+                path=webhook_conf.get('path', '/github/webhook')
+            )
 
-    def cog_unload(self):
+        if self.partition:
+            # Worker process: polling only, scores, sends and maintenance stay with the bot.
+            # Heartbeats have their own loop, so a cycle stuck on a rate limit doesn't look like a dead worker
+            self.heartbeat.change_interval(seconds=max(self.worker_ttl / 4, 1))
+            self.heartbeat.start()
+            self.sync_events.start()
+            return
+        if self.workers:
+            self.drain_outbox.change_interval(seconds=ingestion_conf.get('drain_interval', 1))
+            self.drain_outbox.start()
+        else:
+            self.sync_events.start()
+        self.prune_processed.start()
+        self.flush_scores.change_interval(seconds=config.get('scoring', {}).get('flush_interval', 30))
+        self.flush_scores.start()
+        self.refresh_issues.change_interval(seconds=issues_conf.get('refresh_interval', 900))
+        self.refresh_issues.start()
+        if backfill_conf.get('enabled', True):
+            self.backfill_activity.change_interval(seconds=backfill_conf.get('interval', 300))
+            self.backfill_activity.start()
+
+    async def cog_load(self):
+        # Awards journalled but not applied when the bot last stopped
+        applied = await self.scores.recover()
+        if self.promotions:
+            self.promotions.on_scores_applied(applied)
+        if self.webhook_server:
+            await self.webhook_server.start()
+
+    async def cog_unload(self):
+        self.heartbeat.cancel()
         self.sync_events.cancel()
+        self.drain_outbox.cancel()
+        self.prune_processed.cancel()
+        self.flush_scores.cancel()
+        self.refresh_issues.cancel()
+        self.backfill_activity.cancel()
+        await self.scores.flush()
+        if self.webhook_server:
+            await self.webhook_server.stop()
+        await self.outbound.close()
+
+    async def _on_webhook_delivery(self, event_name, delivery_id, payload):
+        # Called by WebhookServer; only queues the work so GitHub gets its answer right away
+        key = f"delivery:{delivery_id}"
+        if key in self._inflight_deliveries or not self.dedupe.unseen([key]):
+            return False
+
+        self._inflight_deliveries.add(key)
+        task = asyncio.create_task(self._process_webhook(key, webhook_to_event(event_name, payload)))
+        self._webhook_tasks.add(task)
+        task.add_done_callback(self._webhook_tasks.discard)
+        return True
+
+    async def _process_webhook(self, delivery_key, event):
+        try:
+            if event:
+                repo_key = event.repo.lower()
+                subscriptions = group_subscriptions(get_repos()).get(repo_key)
+                if subscriptions:
+                    try:
+                        await self._handle_repo_events(subscriptions, [event])
+                    finally:
+                        self.outbound.flush() # What did go through is still sent
+            await run_write(mark_event_processed, delivery_key)
+            self.dedupe.add([delivery_key])
+        except Exception as e:
+            logging.error(f"Failed to process webhook {delivery_key}: {e}")
+        finally:
+            self._inflight_deliveries.discard(delivery_key)
 
-    @tasks.loop(minutes=2)
+    # Short tick: each repo has its own cadence, this only picks up whichever are due
+    @tasks.loop(seconds=15)
     async def sync_events(self):
-        repos = get_repos()
-        for repo_row in repos:
-            repo_url = repo_row['repo_url']
-            repo_id = repo_row['id']
-            channel_id = repo_row['channel_id']
-            etag = repo_row['last_event_etag']
-            owner = repo_row['owner']
-            name = repo_row['name']
-
-            channel = self.bot.get_channel(channel_id)
-            if not channel:
-                continue
-
-            events, new_etag = self.gh_client.get_repo_events(owner, name, etag)
-            
-            if not events:
-                continue
-            
-            # Process oldest first (reverse of API response) to maintain narrative flow
-            for event in reversed(events):
-                if is_event_processed(event['id']):
+        # Whole owner/name groups: the poll state is written to every row of a fetched repo,
+        # so a row whose channel is gone can't stay due and get the repo fetched every tick
+        # A database error raised out of the loop would stop it for good; the next tick retries
+        try:
+            repos = [row for rows in group_subscriptions(get_due_repos(time.time())).values()
+                     if any(self._polls(r) for r in rows) for row in rows]
+            if self.org_stream:
+                # The org feed has one shared ETag and watermark, so one worker polls it and
+                # routes its events for every repo, whichever worker polls the rest of them
+                if not self.partition or self.partition.owns(self.org_stream.feed):
+                    try:
+                        linked = [r for r in get_repos() if self._delivers(r)]
+                        await self.org_stream.poll(linked, self._handle_repo_events)
+                    except Exception as e:
+                        # The repos it covers are still polled below, or per repo once coverage expires
+                        logging.error(f"Failed to poll the org event stream: {e}")
+                repos = [r for r in repos if not self.org_stream.covers(r)]
+            if repos:
+                await self.poller.run_cycle(repos, self._handle_repo_events)
+        except Exception as e:
+            logging.error(f"Polling cycle failed: {e}")
+        finally:
+            if not self.partition:
+                self.outbound.flush()
+
+    def _polls(self, row):
+        # Whether this process polls the repo of a subscription row (and so all of the repo's rows)
+        if self.partition:
+            return self.partition.owns(f"{row['owner']}/{row['name']}".lower())
+        return self.bot.get_channel(row['channel_id']) is not None
+
+    def _delivers(self, row):
+        # Workers can't see channels; the bot process drops notifications for ones it doesn't have
+        return self.partition is not None or self.bot.get_channel(row['channel_id']) is not None
+
+    async def _handle_repo_events(self, subscriptions, events, poll_state=None):
+        # One fetched page, fanned out to every channel the repo is linked to.
+        # `poll_state` (from RepoPoller) is committed with the page
+        targets = [row for row in subscriptions if self._delivers(row)]
+        if not events:
+            return 0
+
+        # Polling and webhooks can deliver the same repo at once; handle one page at a time
+        repo_key = f"{subscriptions[0]['owner']}/{subscriptions[0]['name']}".lower()
+        async with self._repo_locks.setdefault(repo_key, asyncio.Lock()):
+            return await self._handle_repo_page(targets, events, poll_state)
+
+    async def _handle_repo_page(self, targets, events, poll_state=None):
+        # Each subscription has its own markers; checked against the in-memory filter first,
+        # at most one query for the whole page
+        keyed = [(event, event_key(event)) for event in events]
+        keys = [event.id for event in events if event.id]
+        keys += [subscription_key(ekey, row['channel_id']) for _, ekey in keyed for row in targets]
+        unseen = self.dedupe.unseen(keys)
+        batch = EventBatch()
+        new_events = 0
+        failed = 0
+
+        # Process oldest first (reverse of API response) to maintain narrative flow
+        for event, ekey in reversed(keyed):
+            if event.id and event.id not in unseen:
+                continue # Marked before fan-out existed
+
+            delivered = False
+            for row in targets:
+                key = subscription_key(ekey, row['channel_id'])
+                if key not in unseen:
                     continue
-                
+                unseen.discard(key) # The same action can show up twice in one page
+
+                mark = batch.mark()
                 try:
-                    await self.process_event(channel, event, repo_url)
-                    mark_event_processed(event['id'])
+                    # Points are journalled per event, so fanning out never awards them twice
+                    with PROCESS_EVENT_SECONDS.time(event.type):
+                        await self.process_event(row['channel_id'], event, row['repo_url'], batch)
+                    batch.mark_processed(key)
+                    self._event_failures.pop(key, None)
+                    delivered = True
                 except Exception as e:
-                    print(f"Error processing event {event['id']}: {e}")
-            
-            if new_etag:
-                update_repo_etag(repo_id, new_etag)
-
-    async def _get_random_maintainer(self, repo_url, exclude_id=None):
-        maintainers = get_maintainers_for_repo(repo_url)
-        candidates = [m for m in maintainers if m != exclude_id] if exclude_id else maintainers
+                    batch.rollback(mark)
+                    attempts = self._event_failures.get(key, 0) + 1
+                    if attempts >= self.max_event_attempts:
+                        # Marked processed anyway, so it stops holding back the repo's polling
+                        logging.error(f"Giving up on event {event.id} for channel {row['channel_id']} "
+                                      f"after {attempts} attempts: {e}")
+                        batch.mark_processed(key)
+                        self._event_failures.pop(key, None)
+                        continue
+                    self._event_failures[key] = attempts
+                    failed += 1
+                    print(f"Error processing event {event.id} for channel {row['channel_id']}: {e}")
+            if delivered:
+                # Once per event, not per channel
+                self.issue_index.observe(event, batch)
+                if metrics.enabled:
+                    self._observe_delivery(event)
+            new_events += delivered
+
+        if poll_state:
+            batch.poll_state = poll_state.failed_row() if failed else poll_state.row()
+
+        # Scores, activity journal, processed markers and poll state for the page land in one transaction
+        if batch:
+            journalled = await run_write(commit_event_batch, batch, outbox=self.partition is not None)
+            self.dedupe.add(batch.processed_ids)
+            if not self.partition:
+                # In a worker, the bot process applies the awards and posts the outbox
+                self.scores.add(journalled)
+                for channel_id, text in batch.notifications:
+                    self.outbound.enqueue(channel_id, text)
+        if failed:
+            # The rest of the page is committed, with a poll state that retries the failed events
+            # (the org stream keeps its feed state when handling raises)
+            raise RuntimeError(f"{failed} event deliveries failed")
+        return new_events
+
+    def _observe_delivery(self, event):
+        EVENTS_DELIVERED.inc(event.type)
+        created_at = event.created_at
+        if created_at:
+            # Events API timestamps, e.g. 2024-01-01T12:00:00Z
+            created = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+            EVENT_LAG_SECONDS.observe((datetime.now(timezone.utc) - created).total_seconds())
+
+    @tasks.loop(hours=6)
+    async def prune_processed(self):
+        try:
+            await self.dedupe.prune()
+        except Exception as e:
+            logging.error(f"Failed to prune processed events: {e}")
+
+    @tasks.loop(seconds=30)
+    async def flush_scores(self):
+        # Journalled awards are added to users.score in one transaction per interval
+        try:
+            if self.workers:
+                self.scores.collect() # Awards journalled by the ingestion workers
+            applied = await self.scores.flush()
+            if self.promotions:
+                self.promotions.on_scores_applied(applied)
+        except Exception as e:
+            logging.error(f"Failed to apply scores, will retry: {e}")
+
+    @tasks.loop(seconds=15)
+    async def heartbeat(self):
+        try:
+            await self.partition.heartbeat()
+        except Exception as e:
+            logging.error(f"Worker heartbeat failed: {e}")
+
+    @tasks.loop(seconds=1)
+    async def drain_outbox(self):
+        # Notifications queued by the ingestion workers. A row is only deleted once it was
+        # sent, so a crash or a failed send leaves it for the next drain (at least once)
+        try:
+            rows = get_outbox()
+            if not rows:
+                return
+            by_channel = {}
+            for row in rows:
+                by_channel.setdefault(row['channel_id'], []).append(row)
+            errors = await asyncio.gather(*(self.outbound.send(channel_id, [row['content'] for row in channel_rows])
+                                            for channel_id, channel_rows in by_channel.items()))
+            # Undeliverable ones (channel gone, no permission) are dropped like any other notification
+            done = [row['id'] for channel_rows, error in zip(by_channel.values(), errors)
+                    if not retryable(error) for row in channel_rows]
+            if done:
+                await run_write(delete_outbox, done)
+        except Exception as e:
+            logging.error(f"Failed to drain the outbox: {e}")
+
+    @tasks.loop(seconds=900)
+    async def refresh_issues(self):
+        try:
+            await self.issue_index.refresh()
+        except Exception as e:
+            logging.error(f"Failed to refresh the issue index: {e}")
+
+    @tasks.loop(seconds=300)
+    async def backfill_activity(self):
+        try:
+            await self.backfill.run()
+        except Exception as e:
+            # Checkpoints are per page, the next run resumes from the last one
+            logging.error(f"Activity backfill failed: {e}")
+
+    async def _get_random_maintainer(self, maintainers, exclude_id=None):
+        candidates = tuple(maintainers - {exclude_id})
         if candidates:
             return f"<@{random.choice(candidates)}>"
         return "maintainers"
 
-    async def process_event(self, channel, event, repo_url):
-        etype = event['type']
-        payload = event['payload']
-        actor_gh = event['actor']['login']
-        
-        # Helper: Get Discord Identity
-        def resolve_user(gh_user):
-            row = get_discord_from_github(gh_user)
-            if row:
-                return f"<@{row['discord_id']}>", row['discord_id'], row['score'], True
-            return gh_user, None, 0, False
-
-        actor_mention, actor_id, _, actor_mapped = resolve_user(actor_gh)
-        points_conf = config['scoring']['points']
-
-        if etype == 'IssuesEvent':
-            action = payload['action']
-            issue = payload['issue']
-            issue_url = issue['html_url']
-            
-            if action == 'assigned':
-                assignee_gh = payload.get('assignee', {}).get('login')
-                if assignee_gh:
-                    u_mention, u_id, _, u_mapped = resolve_user(assignee_gh)
-                    if u_mapped:
-                        pts = points_conf.get('issue_assigned', 0)
-                        update_score(u_id, pts)
-                        await channel.send(f"📋 Issue {issue_url} assigned to {u_mention} (+{pts} points)")
-
-            elif action == 'opened':
-                # Check if creator is maintainer
-                maintainers = get_maintainers_for_repo(repo_url)
-                is_maintainer = actor_id in maintainers if actor_id else False
-                
-                if is_maintainer and actor_mapped:
-                    await channel.send(f"📢 Issue available for assignment {issue_url} by {actor_mention}")
-                elif actor_mapped:
-                    # Random maintainer assignment request
-                    mnt_mention = await self._get_random_maintainer(repo_url, exclude_id=actor_id)
-                    await channel.send(f"🐛 Issue created {issue_url} by {actor_mention}. {mnt_mention} please assign.")
-
-        elif etype == 'PullRequestEvent':
-            action = payload['action']
-            pr = payload['pull_request']
-            pr_url = pr['html_url']
-            
-            if action == 'opened' and actor_mapped:
-                mnt_mention = await self._get_random_maintainer(repo_url, exclude_id=actor_id)
-                await channel.send(f"🔌 PR opened {pr_url} by {actor_mention}. {mnt_mention} please review.")
-            
-            elif action == 'closed':
-                if pr.get('merged', False) and actor_mapped:
-                    pts = points_conf.get('pr_merged', 10)
-                    update_score(actor_id, pts)
-                    await channel.send(f"💜 PR merged! {pr_url} from {actor_mention} (+{pts} points)")
-                elif not pr.get('merged', False) and actor_mapped:
-                    await channel.send(f"❌ PR closed without merge {pr_url} from {actor_mention}")
-
-        elif etype == 'PullRequestReviewEvent':
-            action = payload['action']
-            review = payload['review']
-            pr = payload['pull_request']
-            
-            creator_gh = pr['user']['login']
-            creator_mention, creator_id, _, creator_mapped = resolve_user(creator_gh)
-
-            # Check if Reviewer (actor) is maintainer
-            maintainers = get_maintainers_for_repo(repo_url)
-            is_reviewer_maintainer = actor_id in maintainers if actor_id else False
-
-            if action == 'submitted' and is_reviewer_maintainer and creator_mapped:
-                pts = points_conf.get('pr_reviewed', 5)
-                update_score(creator_id, pts)
-                
-                comment_preview = review.get('body') or "No comment."
-                if len(comment_preview) > 50: comment_preview = comment_preview[:47] + "..."
-                
-                await channel.send(f"👀 PR reviewed {pr['html_url']} from {creator_mention} (+{pts} points). Review: {comment_preview}")
+    def _resolve_user(self, gh_user):
+        # Discord identity of a GitHub login (cached, including misses for unlinked users)
+        discord_id = resolve_discord_id(gh_user)
+        if discord_id:
+            return f"<@{discord_id}>", discord_id, True
+        return gh_user, None, False
+
+    async def process_event(self, channel_id, event, repo_url, batch):
+        handler = EVENT_HANDLERS.get((event.type, event.action))
+        if handler is None:
+            return # Nothing to announce or score for this kind of event
+
+        actor_mention, actor_id, actor_mapped = self._resolve_user(event.actor)
+        ctx = EventContext(
+            channel_id, event, batch,
+            # Awards are journalled under this key, shared by the polled and webhook copies
+            event_key(event),
+            # One snapshot of the repo's maintainers for the whole event
+            get_maintainer_set(repo_url),
+            actor_mention, actor_id, actor_mapped,
+            config['scoring']['points']
+        )
+        await handler(self, ctx)
+
+    @handles('IssuesEvent', 'assigned')
+    async def on_issue_assigned(self, ctx):
+        assignee_gh = ctx.event.target
+        if assignee_gh:
+            u_mention, u_id, u_mapped = self._resolve_user(assignee_gh)
+            if u_mapped:
+                pts = ctx.points.get('issue_assigned', 0)
+                ctx.batch.award(ctx.key, 'issue_assigned', u_id, pts)
+                ctx.batch.notify(ctx.channel_id, f"📋 Issue {ctx.event.subject.html_url} assigned to {u_mention} (+{pts} points)")
+
+    @handles('IssuesEvent', 'opened')
+    async def on_issue_opened(self, ctx):
+        issue_url = ctx.event.subject.html_url
+        # Check if creator is maintainer
+        is_maintainer = ctx.actor_id in ctx.maintainers if ctx.actor_id else False
+
+        if is_maintainer and ctx.actor_mapped:
+            ctx.batch.notify(ctx.channel_id, f"📢 Issue available for assignment {issue_url} by {ctx.actor_mention}")
+        elif ctx.actor_mapped:
+            # Random maintainer assignment request
+            mnt_mention = await self._get_random_maintainer(ctx.maintainers, exclude_id=ctx.actor_id)
+            ctx.batch.notify(ctx.channel_id, f"🐛 Issue created {issue_url} by {ctx.actor_mention}. {mnt_mention} please assign.")
+
+    @handles('PullRequestEvent', 'opened')
+    async def on_pr_opened(self, ctx):
+        if ctx.actor_mapped:
+            mnt_mention = await self._get_random_maintainer(ctx.maintainers, exclude_id=ctx.actor_id)
+            ctx.batch.notify(ctx.channel_id, f"🔌 PR opened {ctx.event.subject.html_url} by {ctx.actor_mention}. {mnt_mention} please review.")
+
+    @handles('PullRequestEvent', 'closed')
+    async def on_pr_closed(self, ctx):
+        pr = ctx.event.subject
+        if pr.merged and ctx.actor_mapped:
+            pts = ctx.points.get('pr_merged', 10)
+            ctx.batch.award(ctx.key, 'pr_merged', ctx.actor_id, pts)
+            ctx.batch.notify(ctx.channel_id, f"💜 PR merged! {pr.html_url} from {ctx.actor_mention} (+{pts} points)")
+        elif not pr.merged and ctx.actor_mapped:
+            ctx.batch.notify(ctx.channel_id, f"❌ PR closed without merge {pr.html_url} from {ctx.actor_mention}")
+
+    @handles('PullRequestReviewEvent', 'submitted')
+    async def on_pr_reviewed(self, ctx):
+        pr = ctx.event.subject
+        creator_mention, creator_id, creator_mapped = self._resolve_user(pr.user)
+
+        # Check if Reviewer (actor) is maintainer
+        is_reviewer_maintainer = ctx.actor_id in ctx.maintainers if ctx.actor_id else False
+
+        if is_reviewer_maintainer and creator_mapped:
+            pts = ctx.points.get('pr_reviewed', 5)
+            ctx.batch.award(ctx.key, 'pr_reviewed', creator_id, pts)
+
+            comment_preview = ctx.event.review_body or "No comment."
+            if len(comment_preview) > 50: comment_preview = comment_preview[:47] + "..."
+
+            ctx.batch.notify(ctx.channel_id, f"👀 PR reviewed {pr.html_url} from {creator_mention} (+{pts} points). Review: {comment_preview}")
 
     @sync_events.before_loop
     async def before_sync(self):
         await self.bot.wait_until_ready()
+        if self.partition:
+            # Ownership is only known after the first heartbeat
+            while self.partition.members is None:
+                await asyncio.sleep(0.1)
+
+    @drain_outbox.before_loop
+    async def before_drain(self):
+        await self.bot.wait_until_ready()
 
 async def setup(bot):
     await bot.add_cog(Events(bot))
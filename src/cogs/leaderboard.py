@@ -0,0 +1,72 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+import time
+from typing import Optional
+from database import get_leaderboard, get_user_rank
+
+# Window name -> number of days it covers (None = all time)
+WINDOWS = {
+    'all': None,
+    'today': 1,
+    'week': 7,
+    'month': 30
+}
+
+WINDOW_CHOICES = [
+    app_commands.Choice(name="All time", value="all"),
+    app_commands.Choice(name="Today", value="today"),
+    app_commands.Choice(name="This week (7 days)", value="week"),
+    app_commands.Choice(name="This month (30 days)", value="month")
+]
+
+def window_start(window):
+    # First UTC day included in the window, matching the score_rollups buckets
+    days = WINDOWS[window]
+    if days is None:
+        return None
+    return time.strftime('%Y-%m-%d', time.gmtime(time.time() - (days - 1) * 86400))
+
+class Leaderboard(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @app_commands.command(name="leaderboard", description="Show the top contributors")
+    @app_commands.choices(window=WINDOW_CHOICES)
+    async def leaderboard(self, interaction: discord.Interaction, window: Optional[app_commands.Choice[str]] = None):
+        """Top contributors, all time or over a recent window."""
+        window_value = window.value if window else 'all'
+        label = window.name if window else "All time"
+        rows = get_leaderboard(window_start(window_value), limit=10)
+
+        if not rows:
+            await interaction.response.send_message(f"No points awarded yet ({label.lower()}).", ephemeral=True)
+            return
+
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        lines = [f"{medals.get(i, f'`#{i}`')} <@{row['discord_id']}> — **{row['points']}** points"
+                 for i, row in enumerate(rows, start=1)]
+        embed = discord.Embed(title=f"🏆 Leaderboard — {label}", description="\n".join(lines), color=discord.Color.gold())
+
+        rank, points = get_user_rank(interaction.user.id, window_start(window_value))
+        if rank:
+            embed.set_footer(text=f"Your rank: #{rank} with {points} points")
+        await interaction.response.send_message(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+    @app_commands.command(name="rank", description="Show a user's rank and points")
+    @app_commands.choices(window=WINDOW_CHOICES)
+    async def rank(self, interaction: discord.Interaction, user: Optional[discord.User] = None,
+                   window: Optional[app_commands.Choice[str]] = None):
+        """Rank and points of yourself or another user."""
+        user = user or interaction.user
+        label = window.name if window else "All time"
+        rank, points = get_user_rank(user.id, window_start(window.value if window else 'all'))
+
+        if not rank:
+            await interaction.response.send_message(f"{user.mention} has no points yet ({label.lower()}).", ephemeral=True)
+            return
+        await interaction.response.send_message(f"📈 {user.mention} is **#{rank}** with **{points}** points ({label.lower()}).",
+                                                ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(Leaderboard(bot))
@@ -1,20 +1,26 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import yaml
-import os
 import re
-from database import add_user, get_user_by_discord
-from github_client import GitHubClient
-
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config.yaml')
-with open(CONFIG_PATH, 'r') as f:
-    config = yaml.safe_load(f)
+import logging
+from config import config
+from database import add_user, get_user_by_discord, run_write
+from identity import IdentityVerifier, discord_profile_url
 
 class Verification(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.gh_client = GitHubClient(config['github']['token'], config['github']['organization'])
+        self.gh_client = bot.gh_client
+        # /link lookups are batched into one GraphQL query per short window
+        verification_conf = config.get('verification', {})
+        self.verifier = IdentityVerifier(
+            self.gh_client,
+            window=verification_conf.get('batch_window', 0.5),
+            max_batch=verification_conf.get('max_batch', 50),
+            cache_ttl=verification_conf.get('cache_ttl', 60),
+            cooldown=verification_conf.get('cooldown', 60),
+            max_cooldown=verification_conf.get('max_cooldown', 900)
+        )
 
     @app_commands.command(name="link", description="Link your Discord account to a GitHub username")
     async def link_account(self, interaction: discord.Interaction, github_username: str):
@@ -31,18 +37,29 @@ class Verification(commands.Cog):
             await interaction.response.send_message(f"You are already linked as GitHub user: `{existing_user['github_username']}`", ephemeral=True)
             return
 
+        # Recently failed attempts wait before GitHub is asked again
+        remaining = self.verifier.cooldown_remaining(interaction.user.id)
+        if remaining:
+            await interaction.response.send_message(f"⏳ Verification failed recently. Please try again in {int(remaining) + 1} seconds.", ephemeral=True)
+            return
+
         await interaction.response.send_message(f"Verifying ownership of GitHub account `{github_username}`...", ephemeral=True)
 
         # Feature 1: Verification Logic
-        is_verified = self.gh_client.verify_identity(github_username, interaction.user.id)
+        try:
+            is_verified = await self.verifier.verify(github_username, interaction.user.id)
+        except Exception as e:
+            logging.error(f"Verification of {github_username} failed: {e}")
+            await interaction.edit_original_response(content=f"❌ Could not reach GitHub to verify `{github_username}`. Please try again later.")
+            return
 
         if is_verified:
-            if add_user(interaction.user.id, github_username):
+            if await run_write(add_user, interaction.user.id, github_username):
                 await interaction.edit_original_response(content=f"✅ Successfully linked Discord `@{interaction.user.name}` to GitHub `{github_username}`!")
             else:
                 await interaction.edit_original_response(content=f"❌ Failed to save to database. That GitHub username might be taken.")
         else:
-            await interaction.edit_original_response(content=f"❌ Verification failed. Please add `https://discord.com/users/{interaction.user.id}` to your GitHub Social Accounts (on your profile) and try again.")
+            await interaction.edit_original_response(content=f"❌ Verification failed. Please add `{discord_profile_url(interaction.user.id)}` to your GitHub Social Accounts (on your profile) and try again.")
 
 async def setup(bot):
     await bot.add_cog(Verification(bot))
@@ -0,0 +1,26 @@
+import os
+import yaml
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../config.yaml')
+
+
+def load_config(path=CONFIG_PATH):
+    """
+    Reads config.yaml. Sections that are missing come back empty, so callers
+    only need `.get(...)` with their defaults.
+    """
+    with open(path, 'r') as f:
+        loaded = yaml.safe_load(f) or {}
+    loaded.setdefault('scoring', {}).setdefault('points', {})
+    return loaded
+
+
+# The one config object main.py and every cog read, parsed once per process.
+# Without a config.yaml (benchmarks, tools) everything falls back to defaults;
+# main.py checks `found` and refuses to start.
+try:
+    config = load_config()
+    found = True
+except FileNotFoundError:
+    config = {'scoring': {'points': {}}}
+    found = False
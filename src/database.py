@@ -1,13 +1,109 @@
+import asyncio
+import functools
 import sqlite3
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '../gitcord.db')
 
+# Applied to every connection when it is opened
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL', # Readers don't block the writer and vice versa
+    'PRAGMA synchronous=NORMAL', # Safe with WAL, and one fsync per checkpoint instead of per commit
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000', # ~16MB page cache
+    'PRAGMA busy_timeout=5000'
+)
+
+# github login (lowercase) -> (discord_id or None, expiry), see resolve_discord_id()
+_identity_cache = {}
+IDENTITY_TTL = 3600
+IDENTITY_NEGATIVE_TTL = 600
+IDENTITY_CACHE_SIZE = 50000
+
+# repo_url -> (frozenset of maintainer discord IDs, expiry), see get_maintainer_set()
+_maintainer_cache = {}
+MAINTAINER_CACHE_TTL = 60
+
+# One long-lived connection per thread; sqlite3 connections can't be shared across threads
+_local = threading.local()
+
+def _mark_writer_thread():
+    _local.is_writer = True
+
+# Every write runs on this single thread, so writes are serialized and never run on the event loop
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gitcord-db-writer',
+                             initializer=_mark_writer_thread)
+
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    Returns this thread's persistent connection, opening it on first use.
+    Statements are compiled once and kept in the connection's statement cache.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DB_PATH:
+        conn = sqlite3.connect(DB_PATH, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        _local.path = DB_PATH
     return conn
 
+def _close_thread_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+def close_db():
+    # Closes the writer's and the calling thread's connections; they reopen lazily if used again
+    _writer.submit(_close_thread_connection).result()
+    _close_thread_connection()
+
+def _write(func):
+    """
+    Routes a write function to the writer thread.
+    Called directly it waits for the result, so existing call sites keep working;
+    async code should use `await run_write(func, ...)` instead, which doesn't block the loop.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_local, 'is_writer', False):
+            return func(*args, **kwargs)
+        return _writer.submit(func, *args, **kwargs).result()
+    wrapper.run_on_writer = func
+    return wrapper
+
+# Run time of each function below that runs SQL, i.e. one database round trip per call.
+# The cached lookups in front of them are not timed, so a cache hit costs nothing here
+DB_SECONDS = metrics.Histogram(
+    'gitcord_db_seconds', 'Time spent in database functions', ('function',),
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+)
+
+def _timed(func):
+    # Innermost decorator, so writes are timed on the writer thread without the queueing
+    return metrics.timed(DB_SECONDS, func.__name__)(func)
+
+async def run_write(func, *args, **kwargs):
+    """
+    Awaits a database write on the writer thread without blocking the event loop.
+    """
+    func = getattr(func, 'run_on_writer', func)
+    return await asyncio.wrap_future(_writer.submit(func, *args, **kwargs))
+
+def _add_column(c, table, column, definition):
+    # CREATE TABLE IF NOT EXISTS won't touch existing databases, so new columns are added here
+    columns = [row['name'] for row in c.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+@_write
+@_timed
 def init_db():
     conn = get_connection()
     c = conn.cursor()
@@ -18,9 +114,14 @@ def init_db():
             discord_id INTEGER PRIMARY KEY,
             github_username TEXT UNIQUE,
             score INTEGER DEFAULT 0,
-            last_synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            last_synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            github_login TEXT
         )
     ''')
+    # Lowercased github_username: `= ? COLLATE NOCASE` can't use the UNIQUE index, this one can
+    _add_column(c, 'users', 'github_login', 'TEXT')
+    c.execute('UPDATE users SET github_login = lower(github_username) WHERE github_login IS NULL')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_users_github_login ON users(github_login)')
     
     # Repositories linked to channels
     c.execute('''
@@ -31,10 +132,32 @@ def init_db():
             name TEXT,
             channel_id INTEGER,
             last_event_etag TEXT,
+            poll_interval INTEGER,
+            next_poll_at REAL,
+            last_event_id TEXT,
             UNIQUE(repo_url, channel_id)
         )
     ''')
+    # Per-repo polling cadence (added after the first release)
+    _add_column(c, 'repos', 'poll_interval', 'INTEGER')
+    _add_column(c, 'repos', 'next_poll_at', 'REAL')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_repos_next_poll_at ON repos(next_poll_at)')
+    # Newest event ID handled, the watermark pagination stops at
+    _add_column(c, 'repos', 'last_event_id', 'TEXT')
+    # Last time the org-wide feed returned an event of the repo (it never lists private repos)
+    _add_column(c, 'repos', 'org_feed_seen_at', 'REAL')
     
+    # Polling state of feeds that aren't a single repo (e.g. the org-wide event stream)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS feed_state (
+            feed TEXT PRIMARY KEY,
+            etag TEXT,
+            last_event_id TEXT,
+            poll_interval INTEGER,
+            next_poll_at REAL
+        )
+    ''')
+
     # Maintainers for specific repos
     c.execute('''
         CREATE TABLE IF NOT EXISTS maintainers (
@@ -48,9 +171,14 @@ def init_db():
     # Deduplication table for events (lightweight)
     c.execute('''
         CREATE TABLE IF NOT EXISTS processed_events (
-            event_id TEXT PRIMARY KEY
+            event_id TEXT PRIMARY KEY,
+            processed_at REAL
         )
     ''')
+    # Rows older than the retention window get pruned; pre-existing rows start their clock now
+    _add_column(c, 'processed_events', 'processed_at', 'REAL')
+    c.execute('UPDATE processed_events SET processed_at = ? WHERE processed_at IS NULL', (time.time(),))
+    c.execute('CREATE INDEX IF NOT EXISTS idx_processed_events_processed_at ON processed_events(processed_at)')
     
     # Activity log to prevent double counting (points specific)
     c.execute('''
@@ -59,41 +187,114 @@ def init_db():
             activity_type TEXT,
             discord_id INTEGER,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            points INTEGER,
+            applied INTEGER DEFAULT 0,
             FOREIGN KEY(discord_id) REFERENCES users(discord_id)
         )
     ''')
+    # Points journal: each award is recorded here first and applied to users.score later.
+    # Rows from before the journal had no points column and were already applied.
+    if 'points' not in [row['name'] for row in c.execute('PRAGMA table_info(activity_log)')]:
+        _add_column(c, 'activity_log', 'points', 'INTEGER')
+        _add_column(c, 'activity_log', 'applied', 'INTEGER DEFAULT 0')
+        c.execute('UPDATE activity_log SET applied = 1')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_activity_log_unapplied ON activity_log(applied) WHERE applied = 0')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_activity_log_timestamp ON activity_log(timestamp)')
+
+    # Daily points per user and activity type, for windowed leaderboards
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'score_rollups'")
+    rollups_exist = c.fetchone() is not None
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS score_rollups (
+            day TEXT,
+            discord_id INTEGER,
+            activity_type TEXT,
+            points INTEGER DEFAULT 0,
+            PRIMARY KEY(day, discord_id, activity_type)
+        ) WITHOUT ROWID
+    ''')
+    if not rollups_exist:
+        # One-off backfill from what the journal already holds
+        c.execute('''
+            INSERT INTO score_rollups (day, discord_id, activity_type, points)
+            SELECT date(timestamp), discord_id, activity_type, SUM(points) FROM activity_log
+            WHERE points IS NOT NULL GROUP BY date(timestamp), discord_id, activity_type
+        ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_users_score ON users(score)')
+
+    # Small key/value store for bot-wide state (e.g. search watermarks)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+    # Open issues with the task-assignment label across the org, see issue_index.py
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS issue_index (
+            html_url TEXT PRIMARY KEY,
+            repo TEXT,
+            number INTEGER,
+            title TEXT,
+            assignees TEXT, -- comma separated lowercase logins, '' if unassigned
+            created_at TEXT,
+            updated_at TEXT,
+            seen_at REAL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issue_index_unassigned ON issue_index(created_at) WHERE assignees = ''")
+
+    # Separate ingestion processes (ingestion.workers), see worker.py and partition.py
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS workers (
+            worker_id TEXT PRIMARY KEY,
+            started_at REAL,
+            heartbeat_at REAL
+        )
+    ''')
+    # Notifications written by workers, posted and deleted by the bot process
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel_id INTEGER,
+            content TEXT,
+            created_at REAL
+        )
+    ''')
     
     conn.commit()
-    conn.close()
 
+@_write
+@_timed
 def add_user(discord_id, github_username):
     conn = get_connection()
     c = conn.cursor()
     try:
-        c.execute('INSERT INTO users (discord_id, github_username) VALUES (?, ?)', (discord_id, github_username))
+        # last_synced_at stays NULL until the activity backfill has caught the user up
+        c.execute('INSERT INTO users (discord_id, github_username, github_login, last_synced_at) VALUES (?, ?, ?, NULL)',
+                  (discord_id, github_username, github_username.lower()))
         conn.commit()
+        _identity_cache.pop(github_username.lower(), None)
         return True
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False
-    finally:
-        conn.close()
 
+@_timed
 def get_user_by_discord(discord_id):
-    conn = get_connection()
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('SELECT * FROM users WHERE discord_id = ?', (discord_id,))
-    user = c.fetchone()
-    conn.close()
-    return user
+    return c.fetchone()
 
+@_timed
 def get_all_users():
-    conn = get_connection()
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('SELECT * FROM users')
-    users = c.fetchall()
-    conn.close()
-    return users
+    return c.fetchall()
 
+@_write
+@_timed
 def add_repo(repo_url, channel_id):
     # Parse owner/name from URL (simple assumption)
     # URL format: https://github.com/owner/name
@@ -111,27 +312,27 @@ def add_repo(repo_url, channel_id):
         conn.commit()
         return True
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False
-    finally:
-        conn.close()
 
+@_write
+@_timed
 def remove_repo(repo_url, channel_id):
     conn = get_connection()
     c = conn.cursor()
     c.execute('DELETE FROM repos WHERE repo_url = ? AND channel_id = ?', (repo_url, channel_id))
     rows = c.rowcount
     conn.commit()
-    conn.close()
     return rows > 0
 
+@_timed
 def get_repos():
-    conn = get_connection()
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('SELECT * FROM repos')
-    repos = c.fetchall()
-    conn.close()
-    return repos
+    return c.fetchall()
 
+@_write
+@_timed
 def add_maintainer(discord_id, repo_url):
     conn = get_connection()
     c = conn.cursor()
@@ -142,71 +343,422 @@ def add_maintainer(discord_id, repo_url):
         # Requirement: "make that user maintainer role for that project"
         c.execute('INSERT INTO maintainers (discord_id, repo_url) VALUES (?, ?)', (discord_id, repo_url))
         conn.commit()
+        _maintainer_cache.pop(repo_url, None)
         return True
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False
-    finally:
-        conn.close()
 
+@_write
+@_timed
 def remove_maintainer(discord_id, repo_url):
     conn = get_connection()
     c = conn.cursor()
     c.execute('DELETE FROM maintainers WHERE discord_id = ? AND repo_url = ?', (discord_id, repo_url))
     rows = c.rowcount
     conn.commit()
-    conn.close()
+    _maintainer_cache.pop(repo_url, None)
     return rows > 0
 
+@_timed
 def get_maintainers_for_repo(repo_url):
-    conn = get_connection()
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('SELECT discord_id FROM maintainers WHERE repo_url = ?', (repo_url,))
-    maintainers = [row['discord_id'] for row in c.fetchall()]
-    conn.close()
+    return [row['discord_id'] for row in c.fetchall()]
+
+def get_maintainer_set(repo_url):
+    """
+    Cached set of maintainer Discord IDs for a repo. add_maintainer() / remove_maintainer()
+    invalidate it in this process; other processes (ingestion workers) reload it after
+    MAINTAINER_CACHE_TTL.
+    """
+    cached = _maintainer_cache.get(repo_url)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+    maintainers = frozenset(get_maintainers_for_repo(repo_url))
+    _maintainer_cache[repo_url] = (maintainers, time.time() + MAINTAINER_CACHE_TTL)
     return maintainers
 
+@_timed
 def get_discord_from_github(github_username):
+    c = get_connection().cursor()
+    c.execute('SELECT discord_id, score FROM users WHERE github_login = ?', (github_username.lower(),))
+    return c.fetchone()
+
+def resolve_discord_id(github_username):
+    """
+    Cached GitHub login -> Discord ID lookup, None for unlinked logins.
+    add_user() invalidates its entries in this process; other processes sharing the
+    database (ingestion workers) see the change once the entry expires: after
+    IDENTITY_TTL for linked users, IDENTITY_NEGATIVE_TTL for unlinked ones (bots,
+    outside contributors, most event actors).
+    """
+    login = github_username.lower()
+    cached = _identity_cache.get(login)
+    if cached is not None:
+        discord_id, expires_at = cached
+        if expires_at > time.time():
+            return discord_id
+
+    row = get_discord_from_github(login)
+    if len(_identity_cache) >= IDENTITY_CACHE_SIZE:
+        _identity_cache.clear()
+    if row:
+        _identity_cache[login] = (row['discord_id'], time.time() + IDENTITY_TTL)
+        return row['discord_id']
+    _identity_cache[login] = (None, time.time() + IDENTITY_NEGATIVE_TTL)
+    return None
+
+@_timed
+def get_due_repos(now):
+    """
+    Subscriptions of every repo whose next poll time has passed (or that was never polled).
+    All rows of a due owner/name are returned, even if only one of them is due,
+    so the repo is fetched once for all channels it is linked to.
+    """
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT * FROM repos WHERE lower(owner) || '/' || lower(name) IN (
+            SELECT lower(owner) || '/' || lower(name) FROM repos
+            WHERE next_poll_at IS NULL OR next_poll_at <= ?
+        )
+    ''', (now,))
+    return c.fetchall()
+
+def _update_repo_poll_states(c, states):
+    # Each state is (repo_ids, etag, poll_interval, next_poll_at, last_event_id); same state
+    # for every subscription of one repo, they are polled together
+    c.executemany('''
+        UPDATE repos SET last_event_etag = ?, poll_interval = ?, next_poll_at = ?, last_event_id = ?
+        WHERE id = ?
+    ''', [(etag, poll_interval, next_poll_at, last_event_id, repo_id)
+          for repo_ids, etag, poll_interval, next_poll_at, last_event_id in states for repo_id in repo_ids])
+
+@_write
+@_timed
+def update_repo_poll_states(states):
+    # Repos without new events, saved together once per cycle
+    conn = get_connection()
+    _update_repo_poll_states(conn.cursor(), states)
+    conn.commit()
+
+@_timed
+def get_feed_state(feed):
+    c = get_connection().cursor()
+    c.execute('SELECT * FROM feed_state WHERE feed = ?', (feed,))
+    return c.fetchone()
+
+@_write
+@_timed
+def update_feed_state(feed, etag, poll_interval, next_poll_at, last_event_id):
     conn = get_connection()
     c = conn.cursor()
-    c.execute('SELECT discord_id, score FROM users WHERE github_username = ? COLLATE NOCASE', (github_username,))
-    row = c.fetchone()
-    conn.close()
-    return row
+    c.execute('''
+        INSERT OR REPLACE INTO feed_state (feed, etag, poll_interval, next_poll_at, last_event_id)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (feed, etag, poll_interval, next_poll_at, last_event_id))
+    conn.commit()
 
+@_write
+@_timed
+def mark_in_org_feed(repo_keys, seen_at):
+    # `repo_keys` are lowercase owner/name
+    conn = get_connection()
+    conn.executemany("UPDATE repos SET org_feed_seen_at = ? WHERE lower(owner) || '/' || lower(name) = ?",
+                     [(seen_at, key) for key in repo_keys])
+    conn.commit()
+
+@_write
+@_timed
 def update_repo_etag(repo_id, etag):
     conn = get_connection()
     c = conn.cursor()
     c.execute('UPDATE repos SET last_event_etag = ? WHERE id = ?', (etag, repo_id))
     conn.commit()
-    conn.close()
 
+@_write
+@_timed
 def mark_event_processed(event_id):
     conn = get_connection()
     c = conn.cursor()
     try:
-        c.execute('INSERT INTO processed_events (event_id) VALUES (?)', (event_id,))
+        c.execute('INSERT INTO processed_events (event_id, processed_at) VALUES (?, ?)', (event_id, time.time()))
         conn.commit()
         return True
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False
-    finally:
-        conn.close()
 
+@_timed
 def is_event_processed(event_id):
+    c = get_connection().cursor()
+    c.execute('SELECT 1 FROM processed_events WHERE event_id = ?', (event_id,))
+    return c.fetchone() is not None
+
+@_timed
+def get_unprocessed_event_ids(event_ids):
+    """
+    Returns the subset of `event_ids` not yet in processed_events, in one query per chunk.
+    """
+    event_ids = list(event_ids)
+    seen = set()
+    c = get_connection().cursor()
+    for i in range(0, len(event_ids), 500):
+        chunk = event_ids[i:i + 500]
+        placeholders = ','.join('?' * len(chunk))
+        c.execute(f'SELECT event_id FROM processed_events WHERE event_id IN ({placeholders})', chunk)
+        seen.update(row['event_id'] for row in c.fetchall())
+    return set(event_ids) - seen
+
+@_timed
+def get_recent_processed_events(limit):
+    # Newest first, as (event_id, processed_at) rows
+    c = get_connection().cursor()
+    c.execute('SELECT event_id, processed_at FROM processed_events ORDER BY processed_at DESC LIMIT ?', (limit,))
+    return c.fetchall()
+
+@_timed
+def count_processed_events():
+    c = get_connection().cursor()
+    c.execute('SELECT COUNT(*) FROM processed_events')
+    return c.fetchone()[0]
+
+@_write
+@_timed
+def prune_processed_events(older_than):
     conn = get_connection()
     c = conn.cursor()
-    c.execute('SELECT 1 FROM processed_events WHERE event_id = ?', (event_id,))
-    exists = c.fetchone()
-    conn.close()
-    return exists is not None
+    c.execute('DELETE FROM processed_events WHERE processed_at < ?', (older_than,))
+    rows = c.rowcount
+    conn.commit()
+    return rows
+
+class EventBatch:
+    """
+    Collects the writes for one page of events so they commit in a single transaction
+    with commit_event_batch(): point awards (journalled in activity_log), processed markers,
+    issue_index updates and where polling of the repo resumes.
+    The Discord notifications for the page are collected too, and only sent once it committed.
+    """
+    def __init__(self):
+        self.awards = [] # (activity_id, activity_type, discord_id, points, day)
+        self.processed_ids = []
+        self.notifications = [] # (channel_id, text)
+        self.issues = [] # issue_index records, see issue_index.issue_record()
+        self.poll_state = None # (repo_ids, etag, poll_interval, next_poll_at, last_event_id)
+
+    def award(self, event_id, activity_type, discord_id, points, day=None):
+        # `day` ('YYYY-MM-DD') is the score_rollups bucket, today (UTC) by default
+        self.awards.append((f"{event_id}:{activity_type}", activity_type, discord_id, points, day))
+
+    def mark_processed(self, event_id):
+        self.processed_ids.append(event_id)
+
+    def notify(self, channel_id, text):
+        self.notifications.append((channel_id, text))
+
+    def index_issue(self, record):
+        self.issues.append(record)
+
+    def mark(self):
+        return len(self.awards), len(self.notifications)
+
+    def rollback(self, mark):
+        # Drops what was recorded after `mark`, e.g. by an event that failed half way
+        del self.awards[mark[0]:]
+        del self.notifications[mark[1]:]
+
+    def __bool__(self):
+        return bool(self.awards or self.processed_ids or self.issues or self.poll_state)
+
+def _journal_awards(c, awards):
+    journalled = []
+    today = time.strftime('%Y-%m-%d', time.gmtime()) # Same clock as activity_log.timestamp (UTC)
+    for activity_id, activity_type, discord_id, points, day in awards:
+        c.execute('''
+            INSERT OR IGNORE INTO activity_log (id, activity_type, discord_id, points, applied)
+            VALUES (?, ?, ?, ?, 0)
+        ''', (activity_id, activity_type, discord_id, points))
+        if c.rowcount:
+            journalled.append((activity_id, discord_id, points))
+            c.execute('''
+                INSERT INTO score_rollups (day, discord_id, activity_type, points) VALUES (?, ?, ?, ?)
+                ON CONFLICT(day, discord_id, activity_type) DO UPDATE SET points = points + excluded.points
+            ''', (day or today, discord_id, activity_type, points))
+    return journalled
+
+@_write
+@_timed
+def commit_event_batch(batch, outbox=False):
+    """
+    Applies a whole EventBatch atomically: either every award and marker lands, or none do.
+
+    Awards are only journalled in activity_log (unapplied); users.score is updated later by
+    apply_awards(). An award whose activity is already journalled is skipped, so replays
+    never double count. Returns the newly journalled awards as (activity_id, discord_id, points).
+    With `outbox`, the batch's notifications are queued in the outbox table in the same
+    transaction, for the bot process to post.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        journalled = _journal_awards(c, batch.awards)
+        now = time.time()
+        c.executemany('INSERT OR IGNORE INTO processed_events (event_id, processed_at) VALUES (?, ?)',
+                      [(event_id, now) for event_id in batch.processed_ids])
+        _index_issue_records(c, batch.issues, now)
+        if batch.poll_state:
+            _update_repo_poll_states(c, [batch.poll_state])
+        if outbox:
+            c.executemany('INSERT INTO outbox (channel_id, content, created_at) VALUES (?, ?, ?)',
+                          [(channel_id, text, now) for channel_id, text in batch.notifications])
+        conn.commit()
+        return journalled
+    except Exception:
+        conn.rollback()
+        raise
+
+@_write
+@_timed
+def apply_awards(activity_ids):
+    """
+    Adds the points of the journalled `activity_ids` that are still unapplied to users.score,
+    summed per user, and flags them as applied, in one transaction. IDs that were already
+    applied are skipped, so passing one twice never counts it twice.
+    Returns the {discord_id: points} that were applied.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        # BEGIN IMMEDIATE: nothing can apply the same rows between reading and flagging them
+        c.execute('BEGIN IMMEDIATE')
+        rows = []
+        ids = list(dict.fromkeys(activity_ids))
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            c.execute(f'''
+                SELECT id, discord_id, points FROM activity_log
+                WHERE applied = 0 AND id IN ({','.join('?' * len(chunk))})
+            ''', chunk)
+            rows.extend(c.fetchall())
+        deltas = {}
+        for row in rows:
+            deltas[row['discord_id']] = deltas.get(row['discord_id'], 0) + (row['points'] or 0)
+        c.executemany('UPDATE users SET score = score + ? WHERE discord_id = ?',
+                      [(points, discord_id) for discord_id, points in deltas.items()])
+        c.executemany('UPDATE activity_log SET applied = 1 WHERE id = ?', [(row['id'],) for row in rows])
+        conn.commit()
+        return deltas
+    except Exception:
+        conn.rollback()
+        raise
+
+@_timed
+def get_scores(discord_ids):
+    # {discord_id: score} for the given users
+    discord_ids = list(discord_ids)
+    scores = {}
+    c = get_connection().cursor()
+    for i in range(0, len(discord_ids), 500):
+        chunk = discord_ids[i:i + 500]
+        placeholders = ','.join('?' * len(chunk))
+        c.execute(f'SELECT discord_id, score FROM users WHERE discord_id IN ({placeholders})', chunk)
+        scores.update((row['discord_id'], row['score']) for row in c.fetchall())
+    return scores
+
+@_timed
+def get_leaderboard(since_day=None, limit=10):
+    """
+    Top users by points, as (discord_id, points) rows. All-time uses users.score;
+    with `since_day` ('YYYY-MM-DD', UTC) it sums the daily rollups from that day on.
+    """
+    c = get_connection().cursor()
+    if since_day is None:
+        c.execute('SELECT discord_id, score AS points FROM users WHERE score > 0 ORDER BY score DESC LIMIT ?', (limit,))
+    else:
+        c.execute('''
+            SELECT discord_id, SUM(points) AS points FROM score_rollups WHERE day >= ?
+            GROUP BY discord_id HAVING SUM(points) > 0 ORDER BY SUM(points) DESC LIMIT ?
+        ''', (since_day, limit))
+    return c.fetchall()
+
+@_timed
+def get_user_rank(discord_id, since_day=None):
+    """
+    (rank, points) of one user, same windows as get_leaderboard(). Rank is 1 + the number
+    of users with strictly more points; (None, 0) if the user has no points in the window.
+    """
+    c = get_connection().cursor()
+    if since_day is None:
+        c.execute('SELECT score FROM users WHERE discord_id = ?', (discord_id,))
+        row = c.fetchone()
+        points = row['score'] if row else 0
+        if not points:
+            return None, 0
+        c.execute('SELECT COUNT(*) FROM users WHERE score > ?', (points,))
+    else:
+        c.execute('SELECT COALESCE(SUM(points), 0) FROM score_rollups WHERE day >= ? AND discord_id = ?',
+                  (since_day, discord_id))
+        points = c.fetchone()[0]
+        if not points:
+            return None, 0
+        c.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT SUM(points) AS total FROM score_rollups WHERE day >= ?
+                GROUP BY discord_id HAVING total > ?
+            )
+        ''', (since_day, points))
+    return c.fetchone()[0] + 1, points
+
+@_timed
+def get_users_to_backfill(synced_before, limit):
+    # Never backfilled first, then the longest since their last sync
+    c = get_connection().cursor()
+    c.execute('''
+        SELECT * FROM users WHERE last_synced_at IS NULL OR last_synced_at < ?
+        ORDER BY last_synced_at IS NOT NULL, last_synced_at LIMIT ?
+    ''', (synced_before, limit))
+    return c.fetchall()
+
+@_write
+@_timed
+def commit_backfill_page(batch, discord_ids, synced_at):
+    """
+    Journals the awards of one page of backfilled activity and moves the users'
+    last_synced_at checkpoint forward to `synced_at` in the same transaction, so a
+    restart resumes after the last committed page. A checkpoint never moves back.
+    Returns the newly journalled awards, like commit_event_batch().
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        journalled = _journal_awards(c, batch.awards)
+        c.executemany('''
+            UPDATE users SET last_synced_at = ? WHERE discord_id = ? AND (last_synced_at IS NULL OR last_synced_at < ?)
+        ''', [(synced_at, discord_id, synced_at) for discord_id in discord_ids])
+        conn.commit()
+        return journalled
+    except Exception:
+        conn.rollback()
+        raise
 
+@_timed
+def get_unapplied_awards():
+    # Journalled awards not yet added to users.score, e.g. after a crash
+    c = get_connection().cursor()
+    c.execute('SELECT id, discord_id, points FROM activity_log WHERE applied = 0')
+    return c.fetchall()
+
+@_write
+@_timed
 def update_score(discord_id, points):
     conn = get_connection()
     c = conn.cursor()
     c.execute('UPDATE users SET score = score + ? WHERE discord_id = ?', (points, discord_id))
     conn.commit()
-    conn.close()
 
+@_write
+@_timed
 def log_activity(activity_id, activity_type, discord_id):
     conn = get_connection()
     c = conn.cursor()
@@ -216,6 +768,116 @@ def log_activity(activity_id, activity_type, discord_id):
         conn.commit()
         return True
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False # Activity already logged
-    finally:
-        conn.close()
+
+@_timed
+def get_meta(key):
+    c = get_connection().cursor()
+    c.execute('SELECT value FROM meta WHERE key = ?', (key,))
+    row = c.fetchone()
+    return row['value'] if row else None
+
+@_write
+@_timed
+def set_meta(key, value):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+    conn.commit()
+
+def _index_issue_records(c, records, seen_at):
+    # Listed issues are upserted, the rest removed; an older snapshot never overwrites a newer one
+    listed = [record[:7] + (seen_at,) for record in records if record[7]]
+    unlisted = [(record[0], record[6]) for record in records if not record[7]]
+    c.executemany('''
+        INSERT INTO issue_index (html_url, repo, number, title, assignees, created_at, updated_at, seen_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(html_url) DO UPDATE SET
+            title = excluded.title, assignees = excluded.assignees,
+            updated_at = excluded.updated_at, seen_at = excluded.seen_at
+        WHERE excluded.updated_at >= issue_index.updated_at
+    ''', listed)
+    c.executemany('DELETE FROM issue_index WHERE html_url = ? AND updated_at <= ?', unlisted)
+
+@_write
+@_timed
+def index_issues(records, seen_at):
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        _index_issue_records(c, records, seen_at)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+@_write
+@_timed
+def prune_issue_index(seen_before):
+    # Drops issues a complete refresh didn't return any more (e.g. unlabeled in an unlinked repo)
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute('DELETE FROM issue_index WHERE seen_at < ?', (seen_before,))
+    conn.commit()
+    return c.rowcount
+
+@_timed
+def get_indexed_issues():
+    # Oldest first
+    c = get_connection().cursor()
+    c.execute('SELECT * FROM issue_index ORDER BY created_at')
+    return c.fetchall()
+
+@_timed
+def count_indexed_issues():
+    c = get_connection().cursor()
+    c.execute('SELECT COUNT(*) FROM issue_index')
+    return c.fetchone()[0]
+
+@_write
+@_timed
+def heartbeat_worker(worker_id):
+    conn = get_connection()
+    now = time.time()
+    conn.execute('''
+        INSERT INTO workers (worker_id, started_at, heartbeat_at) VALUES (?, ?, ?)
+        ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+    ''', (worker_id, now, now))
+    conn.commit()
+
+@_write
+@_timed
+def remove_worker(worker_id):
+    # On clean shutdown, so the others take over its repos without waiting for the heartbeat to expire
+    conn = get_connection()
+    conn.execute('DELETE FROM workers WHERE worker_id = ?', (worker_id,))
+    conn.commit()
+
+@_timed
+def get_live_workers(heartbeat_since):
+    # IDs of workers that sent a heartbeat at or after `heartbeat_since`, sorted
+    c = get_connection().cursor()
+    c.execute('SELECT worker_id FROM workers WHERE heartbeat_at >= ? ORDER BY worker_id', (heartbeat_since,))
+    return [row['worker_id'] for row in c.fetchall()]
+
+@_timed
+def get_outbox(limit=500):
+    # Oldest first; ids only grow, since SQLite commits one writer at a time
+    c = get_connection().cursor()
+    c.execute('SELECT id, channel_id, content FROM outbox ORDER BY id LIMIT ?', (limit,))
+    return c.fetchall()
+
+@_write
+@_timed
+def delete_outbox(ids):
+    # Only the rows that were sent; the others stay for the next drain
+    conn = get_connection()
+    conn.executemany('DELETE FROM outbox WHERE id = ?', [(outbox_id,) for outbox_id in ids])
+    conn.commit()
+
+@_timed
+def count_outbox():
+    c = get_connection().cursor()
+    c.execute('SELECT COUNT(*) FROM outbox')
+    return c.fetchone()[0]
@@ -0,0 +1,134 @@
+import logging
+import time
+from collections import OrderedDict
+from database import (get_recent_processed_events, count_processed_events,
+                      get_unprocessed_event_ids, prune_processed_events, run_write)
+
+
+def event_key(event):
+    """
+    Identity of what happened (an EventRecord), independent of where the event came from.
+
+    A polled event and the webhook delivery for the same action have different
+    (or no) IDs, so both are keyed by the object they touch and what changed, and
+    the polling fallback doesn't repeat what a webhook already delivered. Types
+    without a known shape fall back to the Events API ID.
+    """
+    etype = event.type
+    action = event.action
+    subject = event.subject
+
+    if etype == 'IssuesEvent' and subject is not None:
+        if action in ('assigned', 'unassigned', 'labeled', 'unlabeled'):
+            detail = event.target # Assignee login / label name
+        elif action == 'opened':
+            detail = ''
+        elif action == 'closed':
+            detail = subject.closed_at
+        else:
+            detail = subject.updated_at
+        return f"{etype}:{action}:{subject.html_url}:{detail}"
+
+    if etype == 'PullRequestEvent' and subject is not None:
+        if action == 'opened':
+            detail = ''
+        elif action == 'closed':
+            detail = subject.closed_at
+        else:
+            detail = subject.updated_at
+        return f"{etype}:{action}:{subject.html_url}:{detail}"
+
+    if etype == 'PullRequestReviewEvent' and event.review_id is not None:
+        return f"{etype}:{action}:{event.review_id}"
+
+    return event.id
+
+
+def subscription_key(key, channel_id):
+    """
+    processed_events key for one event (see event_key()) delivered to one channel.
+    Markers written before repos were fanned out are the bare event ID, and
+    still count as delivered to every channel.
+    """
+    return f"{key}:{channel_id}"
+
+
+class ProcessedEventFilter:
+    """
+    In-memory front for the processed_events table.
+
+    Keeps the most recent `capacity` processed IDs in memory (rebuilt from SQLite
+    at startup) so most duplicate checks never touch the database. While every row
+    of the table fits in memory the filter is authoritative and SQLite is not
+    queried at all; once older IDs have been evicted, only the IDs missing from
+    memory are looked up.
+
+    The table itself is bounded by `retention` seconds. The Events API only serves
+    events from the last 90 days, so that is the default: an older ID can never
+    come back.
+
+    With `shared`, other processes (ingestion workers) write to the same table,
+    so memory is never authoritative and misses are always checked in SQLite.
+    """
+    def __init__(self, capacity=100000, retention=90 * 24 * 3600, shared=False):
+        self.capacity = capacity
+        self.retention = retention
+        self.shared = shared
+        self._recent = OrderedDict() # event_id -> processed_at, oldest first
+        self.complete = False
+        self.memory_hits = 0
+        self.db_lookups = 0
+
+    def load(self):
+        rows = get_recent_processed_events(self.capacity)
+        self._recent = OrderedDict((row['event_id'], row['processed_at']) for row in reversed(rows))
+        self.complete = not self.shared and count_processed_events() <= self.capacity
+
+    def unseen(self, event_ids):
+        """
+        Returns the subset of `event_ids` that hasn't been processed yet.
+        """
+        event_ids = set(event_ids)
+        candidates = event_ids.difference(self._recent)
+        self.memory_hits += len(event_ids) - len(candidates)
+
+        if not candidates or self.complete:
+            self.memory_hits += len(candidates)
+            return candidates
+
+        self.db_lookups += len(candidates)
+        return get_unprocessed_event_ids(candidates)
+
+    def add(self, event_ids):
+        # Call after the IDs were committed to processed_events
+        now = time.time()
+        for event_id in event_ids:
+            self._recent[event_id] = now
+            self._recent.move_to_end(event_id)
+        while len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
+            self.complete = False
+
+    async def prune(self):
+        cutoff = time.time() - self.retention
+        deleted = await run_write(prune_processed_events, cutoff)
+        while self._recent:
+            event_id, processed_at = next(iter(self._recent.items()))
+            if processed_at is not None and processed_at >= cutoff:
+                break
+            self._recent.popitem(last=False)
+        if not self.complete and not self.shared:
+            self.complete = count_processed_events() <= len(self._recent)
+        logging.info(f"Pruned {deleted} processed events older than {self.retention}s, stats: {self.stats()}")
+        return deleted
+
+    def stats(self):
+        checks = self.memory_hits + self.db_lookups
+        return {
+            'memory_size': len(self._recent),
+            'table_size': count_processed_events(),
+            'memory_hits': self.memory_hits,
+            'db_lookups': self.db_lookups,
+            'hit_rate': self.memory_hits / checks if checks else None,
+            'complete': self.complete
+        }
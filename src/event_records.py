@@ -0,0 +1,138 @@
+import json
+import re
+
+# Review bodies are only ever previewed
+REVIEW_BODY_LENGTH = 100
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class Subject:
+    """
+    The issue or pull request an event is about, reduced to the fields the
+    handlers, dedupe keys and the issue index read.
+    """
+    __slots__ = ('html_url', 'number', 'title', 'state', 'user', 'labels', 'assignees',
+                 'merged', 'is_pull_request', 'created_at', 'updated_at', 'closed_at')
+
+    def __init__(self, html_url, number=None, title=None, state=None, user=None, labels=(), assignees=(),
+                 merged=False, is_pull_request=False, created_at=None, updated_at=None, closed_at=None):
+        self.html_url = html_url
+        self.number = number
+        self.title = title
+        self.state = state
+        self.user = user
+        self.labels = labels
+        self.assignees = assignees
+        self.merged = merged
+        self.is_pull_request = is_pull_request
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.closed_at = closed_at
+
+    @classmethod
+    def from_api(cls, data, is_pull_request=None):
+        """
+        From an issue or pull request object of the REST API (event payloads, search results).
+        """
+        labels = tuple(label['name'] if isinstance(label, dict) else label for label in data.get('labels') or ())
+        return cls(
+            data['html_url'],
+            number=data.get('number'),
+            title=data.get('title'),
+            state=data.get('state'),
+            user=(data.get('user') or {}).get('login'),
+            labels=labels,
+            assignees=tuple(assignee['login'] for assignee in data.get('assignees') or ()),
+            merged=data.get('merged', False),
+            is_pull_request='pull_request' in data if is_pull_request is None else is_pull_request,
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at'),
+            closed_at=data.get('closed_at')
+        )
+
+
+class EventRecord:
+    """
+    One GitHub event with only what the bot uses, instead of the full JSON payload
+    (bodies, diffs metadata, user and repo objects). `target` is the assignee login
+    for (un)assigned events and the label name for (un)labeled ones.
+    """
+    __slots__ = ('id', 'type', 'action', 'actor', 'repo', 'created_at', 'subject', 'target',
+                 'review_id', 'review_body')
+
+    def __init__(self, id, type, action=None, actor=None, repo=None, created_at=None, subject=None,
+                 target=None, review_id=None, review_body=None):
+        self.id = id
+        self.type = type
+        self.action = action
+        self.actor = actor
+        self.repo = repo
+        self.created_at = created_at
+        self.subject = subject
+        self.target = target
+        self.review_id = review_id
+        self.review_body = review_body
+
+    @classmethod
+    def from_api(cls, data):
+        """
+        From one Events API event (or a webhook delivery reshaped like one).
+        """
+        payload = data.get('payload') or {}
+        action = payload.get('action')
+
+        subject = None
+        if payload.get('issue'):
+            subject = Subject.from_api(payload['issue'])
+        elif payload.get('pull_request'):
+            subject = Subject.from_api(payload['pull_request'], is_pull_request=True)
+
+        target = None
+        if action in ('assigned', 'unassigned'):
+            target = (payload.get('assignee') or {}).get('login')
+        elif action in ('labeled', 'unlabeled'):
+            target = (payload.get('label') or {}).get('name')
+
+        review = payload.get('review')
+        return cls(
+            data.get('id'),
+            data['type'],
+            action=action,
+            actor=(data.get('actor') or {}).get('login'),
+            repo=(data.get('repo') or {}).get('name'),
+            created_at=data.get('created_at'),
+            subject=subject,
+            target=target,
+            review_id=review['id'] if review else None,
+            review_body=(review.get('body') or '')[:REVIEW_BODY_LENGTH] if review else None
+        )
+
+
+def iter_json_array(text):
+    """
+    Decodes a JSON array one element at a time, so only one element's dicts
+    exist at once instead of the whole page's.
+    """
+    index = _WHITESPACE.match(text, 0).end()
+    if text[index:index + 1] != '[':
+        raise ValueError("Expected a JSON array")
+    index = _WHITESPACE.match(text, index + 1).end()
+    if text[index:index + 1] == ']':
+        return
+    while True:
+        value, index = _decoder.raw_decode(text, index)
+        yield value
+        index = _WHITESPACE.match(text, index).end()
+        if text[index:index + 1] == ',':
+            index = _WHITESPACE.match(text, index + 1).end()
+        elif text[index:index + 1] == ']':
+            return
+        else:
+            raise ValueError(f"Expected ',' or ']' at position {index}")
+
+
+def parse_event_page(text):
+    # Events API page (a JSON array) -> list of EventRecord
+    return [EventRecord.from_api(event) for event in iter_json_array(text)]
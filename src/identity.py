@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+
+
+def discord_profile_url(discord_id):
+    return f"https://discord.com/users/{discord_id}"
+
+
+class IdentityVerifier:
+    """
+    Verifies /link attempts in bulk.
+
+    Lookups are collected for `window` seconds (or until `max_batch` logins are
+    waiting) and sent as one aliased GraphQL query, so a burst of hundreds of
+    attempts costs a handful of requests. Concurrent attempts for the same login
+    share one lookup, and results are cached for `cache_ttl` seconds.
+
+    A failed attempt puts the Discord user on a cooldown that doubles with every
+    further failure, up to `max_cooldown`, so retrying in a loop doesn't eat into
+    the GraphQL budget. Keep `cache_ttl` at or below `cooldown`, so a retry after
+    fixing the profile sees fresh data.
+    """
+    def __init__(self, gh_client, window=0.5, max_batch=50, cache_ttl=60, cooldown=60, max_cooldown=900):
+        self.gh_client = gh_client
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_ttl = cache_ttl
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._pending = {} # login -> future of its social account URLs
+        self._timer = None
+        self._batches = set()
+        self._cache = {} # login -> (urls or None, expiry)
+        self._failures = {} # discord_id -> (failed attempts, blocked until)
+        self.requests = 0
+        self.cache_hits = 0
+
+    def cooldown_remaining(self, discord_id):
+        # Seconds until this user may try again, 0 if they can now
+        failure = self._failures.get(discord_id)
+        return max(0, failure[1] - time.monotonic()) if failure else 0
+
+    async def verify(self, github_username, discord_id):
+        """
+        True if `github_username` lists the user's Discord profile in its social accounts.
+        Raises if GitHub couldn't be asked; that doesn't count as a failed attempt.
+        """
+        urls = await self._social_accounts(github_username.lower())
+        if urls is not None and discord_profile_url(discord_id) in urls:
+            self._failures.pop(discord_id, None)
+            return True
+
+        failures = self._failures.get(discord_id, (0, 0))[0] + 1
+        delay = min(self.cooldown * 2 ** (failures - 1), self.max_cooldown)
+        self._failures[discord_id] = (failures, time.monotonic() + delay)
+        return False
+
+    async def _social_accounts(self, login):
+        cached = self._cache.get(login)
+        if cached and cached[1] > time.monotonic():
+            self.cache_hits += 1
+            return cached[0]
+
+        future = self._pending.get(login)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[login] = loop.create_future()
+            if len(self._pending) >= self.max_batch:
+                self._send_batch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._send_batch)
+        # Shielded: one attempt giving up mustn't cancel the lookup for the others waiting on it
+        return await asyncio.shield(future)
+
+    def _send_batch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._lookup(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _lookup(self, batch):
+        self.requests += 1
+        try:
+            accounts = await self.gh_client.get_social_accounts(list(batch))
+        except Exception as e:
+            logging.error(f"Social account lookup for {len(batch)} users failed: {e}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        now = time.monotonic()
+        if len(self._cache) > 10000:
+            self._cache = {login: entry for login, entry in self._cache.items() if entry[1] > now}
+        for login, future in batch.items():
+            urls = accounts.get(login)
+            self._cache[login] = (urls, now + self.cache_ttl)
+            if not future.done():
+                future.set_result(urls)
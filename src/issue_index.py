@@ -0,0 +1,147 @@
+import heapq
+import logging
+import time
+from event_records import Subject
+from database import (get_meta, set_meta, index_issues, prune_issue_index, get_indexed_issues,
+                      get_all_users, run_write)
+
+
+def issue_record(repo, issue, label):
+    """
+    Flattens an issue (event_records.Subject) into an issue_index record. The last field
+    says whether it belongs in the index at all: open, carrying `label`, and not a pull request.
+    """
+    listed = (issue.state == 'open' and not issue.is_pull_request
+              and label.lower() in {name.lower() for name in issue.labels})
+    assignees = ','.join(sorted(login.lower() for login in issue.assignees))
+    return (issue.html_url, repo, issue.number, issue.title, assignees,
+            issue.created_at, issue.updated_at, listed)
+
+
+def _search_item_repo(item):
+    # repository_url is https://api.github.com/repos/<owner>/<name>
+    return '/'.join(item['repository_url'].rstrip('/').split('/')[-2:])
+
+
+class IssueIndex:
+    """
+    Local index of the org's open issues carrying the task-assignment label
+    (the `issue_index` table), so matching never searches GitHub.
+
+    `refresh()` only asks Search for issues updated since the newest `updated_at`
+    it has seen, and IssuesEvents from linked repos keep it current in between
+    (`observe()`, committed with the page's EventBatch). Issues that lose the label
+    in a repo that isn't linked produce no event, so once every `full_interval`
+    seconds all open issues are listed again and the ones missing are dropped.
+
+    Search stops at 1000 results per query, so both walks continue with
+    `updated:>=` the newest `updated_at` received until a query returns everything
+    it matched.
+    """
+    def __init__(self, gh_client, label='good first issue', full_interval=24 * 3600):
+        self.gh_client = gh_client
+        self.label = label
+        self.full_interval = full_interval
+        self._key = f"issue_index:{label.lower()}"
+        self.last_refresh = None
+
+    def observe(self, event, batch):
+        # Called once per new event, whichever channels it went to
+        if event.type != 'IssuesEvent' or event.subject is None:
+            return
+        batch.index_issue(issue_record(event.repo, event.subject, self.label))
+
+    async def refresh(self, full=False):
+        """
+        Brings the index up to date. Returns the number of issues fetched.
+        """
+        watermark = get_meta(f"{self._key}:updated_at")
+        last_full = float(get_meta(f"{self._key}:full_at") or 0)
+        started = time.time()
+        full = full or watermark is None or started - last_full >= self.full_interval
+
+        cursor = None if full else watermark
+        newest = None
+        fetched = 0
+        complete = False
+        while True:
+            items, total = await self.gh_client.search_labeled_issues(self.label, cursor, open_only=full)
+            records = [issue_record(_search_item_repo(item), Subject.from_api(item), self.label) for item in items]
+            await run_write(index_issues, records, started)
+            fetched += len(items)
+            if items:
+                # Oldest update first, so the last item is the newest
+                newest = items[-1]['updated_at']
+                if not full:
+                    # Progress is kept if a later query fails
+                    await self._advance_watermark(newest)
+            if len(items) >= total:
+                complete = True
+                break
+            if not items or newest == cursor:
+                logging.warning(f"Issue index: over 1000 issues updated at {cursor}, the rest can't be listed")
+                break
+            # Inclusive `updated:>=`, so issues updated in the same second aren't lost
+            cursor = newest
+
+        pruned = 0
+        if full and complete:
+            # Everything open was listed; whatever wasn't seen is closed or unlabeled
+            pruned = await run_write(prune_issue_index, started)
+            if newest:
+                await self._advance_watermark(newest)
+        if full:
+            await run_write(set_meta, f"{self._key}:full_at", str(started))
+
+        self.last_refresh = {
+            'full': full,
+            'fetched': fetched,
+            'complete': complete,
+            'pruned': pruned,
+            'duration': time.time() - started
+        }
+        logging.info(
+            f"Issue index ({'full' if full else 'incremental'}): {fetched} issues fetched"
+            f"{'' if complete else ' (incomplete)'}, {pruned} pruned in {self.last_refresh['duration']:.2f}s"
+        )
+        return fetched
+
+    async def _advance_watermark(self, updated_at):
+        # Never backwards: a full walk only sees open issues, and may end below the stored watermark
+        current = get_meta(f"{self._key}:updated_at")
+        if current is None or updated_at > current:
+            await run_write(set_meta, f"{self._key}:updated_at", updated_at)
+
+    def match(self, max_load=1, limit=None):
+        """
+        Pairs unassigned indexed issues, oldest first, with linked contributors that
+        have fewer than `max_load` indexed issues assigned. Each issue goes to the least
+        loaded contributor, ties broken by highest score; a min-heap keeps that
+        O(issues * log(contributors)). Returns a list of (issue row, discord_id).
+        """
+        issues = get_indexed_issues()
+        loads = {}
+        unassigned = []
+        for issue in issues:
+            if issue['assignees']:
+                for login in issue['assignees'].split(','):
+                    loads[login] = loads.get(login, 0) + 1
+            else:
+                unassigned.append(issue)
+
+        heap = []
+        for user in get_all_users():
+            load = loads.get(user['github_login'], 0)
+            if load < max_load:
+                heap.append((load, -(user['score'] or 0), user['discord_id']))
+        heapq.heapify(heap)
+
+        pairs = []
+        for issue in unassigned:
+            if not heap or (limit is not None and len(pairs) >= limit):
+                break
+            load, neg_score, discord_id = heapq.heappop(heap)
+            pairs.append((issue, discord_id))
+            if load + 1 < max_load:
+                heapq.heappush(heap, (load + 1, neg_score, discord_id))
+        return pairs
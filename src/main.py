@@ -1,44 +1,122 @@
+import time
+# Counted from process start, so imports and config parsing are included
+STARTED = time.perf_counter()
+
 import discord
 from discord.ext import commands
-import yaml
 import sys
-import os
-
-# Load config
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../config.yaml')
-try:
-    with open(CONFIG_PATH, 'r') as f:
-        config = yaml.safe_load(f)
-except FileNotFoundError:
+import json
+import hashlib
+import logging
+from config import config, found as config_found
+from github_client import AsyncGitHubClient
+from database import init_db, close_db, get_meta, set_meta, run_write
+import metrics
+
+if not config_found:
     print("config.yaml not found!")
     sys.exit(1)
 
+STARTUP_SECONDS = metrics.Gauge('gitcord_startup_seconds', 'Startup time by phase, of the last start', ('phase',))
+
+EXTENSIONS = ('cogs.verification', 'cogs.events', 'cogs.admin', 'cogs.leaderboard')
+
+# Instrumentation is off unless enabled; it then also serves a Prometheus endpoint
+metrics_conf = config.get('metrics', {})
+if metrics_conf.get('enabled', False):
+    metrics.enable()
+
 # Initialize Bot
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True # Needed for role management
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+class GitCordBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # One shared GitHub client (and connection pool) for every cog
+        self.gh_client = AsyncGitHubClient(
+            config['github']['token'],
+            config['github']['organization'],
+            timeout=config['github'].get('timeout', 10),
+            pool_size=config['github'].get('pool_size', 20)
+        )
+        self.metrics_server = None
+        if metrics.enabled:
+            self.metrics_server = metrics.MetricsServer(
+                host=metrics_conf.get('host', '127.0.0.1'),
+                port=metrics_conf.get('port', 9108)
+            )
+
+        # Filled in once by setup_hook and the first on_ready, shown in /stats
+        self.startup = {}
+
+    async def setup_hook(self):
+        """
+        Runs once, before the gateway connects. on_ready fires again on every
+        reconnect, so nothing that should only happen once belongs there.
+        """
+        if self.metrics_server:
+            await self.metrics_server.start()
+
+        start = time.perf_counter()
+        for extension in EXTENSIONS:
+            await self.load_extension(extension)
+        self.startup['cogs'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.startup['synced'] = await self.sync_commands(force='--sync-commands' in sys.argv)
+        self.startup['sync'] = time.perf_counter() - start
+
+    async def sync_commands(self, force=False):
+        """
+        Uploads the command tree only if it changed since the last successful sync
+        (a hash of the command payloads is kept in the meta table). Returns whether it synced.
+        """
+        payloads = [command.to_dict(self.tree) for command in self.tree.get_commands()]
+        digest = hashlib.sha256(json.dumps(payloads, sort_keys=True).encode()).hexdigest()
+        key = f"command_tree_hash:{self.application_id}"
+        if not force and get_meta(key) == digest:
+            print(f"Command tree unchanged, skipped sync ({len(payloads)} command(s))")
+            return False
+
+        try:
+            synced = await self.tree.sync()
+        except Exception as e:
+            print(f"Failed to sync commands: {e}")
+            return False
+        await run_write(set_meta, key, digest)
+        print(f"Synced {len(synced)} command(s)")
+        return True
+
+    async def close(self):
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        await self.gh_client.close()
+        await super().close()
+        close_db()
+
+bot = GitCordBot(command_prefix='!', intents=intents)
 
 # Database Init
-from database import init_db
 init_db()
 
 @bot.event
 async def on_ready():
+    # Also fires after every gateway reconnect; cogs and commands are set up in setup_hook
+    if 'ready' in bot.startup:
+        logging.info(f"Reconnected as {bot.user}")
+        return
+    bot.startup['ready'] = time.perf_counter() - STARTED
+    STARTUP_SECONDS.set(bot.startup['cogs'], 'cogs')
+    STARTUP_SECONDS.set(bot.startup['sync'], 'command_sync')
+    STARTUP_SECONDS.set(bot.startup['ready'], 'ready')
     print(f'Logged in as {bot.user} (ID: {bot.user.id})')
+    print(
+        f"Ready in {bot.startup['ready']:.2f}s (cogs {bot.startup['cogs']:.2f}s, command sync "
+        f"{'%.2fs' % bot.startup['sync'] if bot.startup['synced'] else 'skipped'})"
+    )
     print('------')
-    # Load Cogs
-    await bot.load_extension('cogs.verification')
-    await bot.load_extension('cogs.events')
-    await bot.load_extension('cogs.admin')
-    
-    # Sync Slash Commands
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
 
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
@@ -97,7 +175,8 @@ if __name__ == '__main__':
         sys.exit(1)
         
     try:
-        bot.run(token)
+        # root_logger=True so our own logging.info output (e.g. poll cycle stats) is shown too
+        bot.run(token, root_logger=True)
     except discord.errors.LoginFailure:
         print("❌ Error: Invalid Discord Token. Please check config.yaml")
     except Exception as e:
@@ -0,0 +1,230 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from aiohttp import web
+
+# Off until enable() is called; every update is a single flag check until then
+enabled = False
+
+# Seconds; covers a cached SQLite read up to a slow GitHub request
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+# Metrics are updated from the event loop and the database writer thread
+_lock = threading.Lock()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {} # label values -> state
+        _registry.append(self)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            values = list(self._values.items())
+        for labels, state in values:
+            lines.extend(self._lines(labels, state))
+        return lines
+
+    def _lines(self, labels, value):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {value}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not enabled:
+            return
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def total(self):
+        return sum(self._values.values())
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        if not enabled:
+            return
+        with _lock:
+            self._values[labels] = value
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        if not enabled:
+            return
+        with _lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per bucket counts (last one is +Inf), sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        # Context manager timing its block; shared no-op while disabled
+        return _Timer(self, labels) if enabled else _NULL_TIMER
+
+    def summary(self, *labels):
+        """
+        {count, avg, p50, p95} for one label set, quantiles as bucket upper bounds.
+        With no labels given, everything observed is merged.
+        """
+        with _lock:
+            states = [self._values[labels]] if labels in self._values else (
+                list(self._values.values()) if not labels else [])
+            counts = [sum(column) for column in zip(*(state[0] for state in states))]
+            total = sum(state[1] for state in states)
+            count = sum(state[2] for state in states)
+        if not count:
+            return None
+        return {'count': count, 'avg': total / count,
+                'p50': self._quantile(counts, count, 0.5), 'p95': self._quantile(counts, count, 0.95)}
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def total_count(self):
+        return sum(state[2] for state in list(self._values.values()))
+
+    def _quantile(self, counts, count, q):
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            seen += bucket_count
+            if seen >= q * count:
+                return bound
+        return float('inf')
+
+    def _lines(self, labels, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def timed(histogram, *labels):
+    """
+    Decorator observing a function's run time in `histogram`.
+    While metrics are disabled it only adds the flag check.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+        return wrapper
+    return decorator
+
+
+def render():
+    # Prometheus text exposition format
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    Serves render() at http://host:port/metrics for Prometheus to scrape.
+    Binds to localhost by default; the numbers aren't meant to be public.
+    """
+    def __init__(self, host='127.0.0.1', port=9108, path='/metrics'):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"Metrics endpoint listening on http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request):
+        return web.Response(text=render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import re
+import discord
+import metrics
+
+# Discord limits
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBED_DESCRIPTION = 4096
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_TOTAL = 6000
+
+MENTION_RE = re.compile(r'<@!?\d+>')
+
+SEND_SECONDS = metrics.Histogram('gitcord_discord_send_seconds', 'Time of each channel.send call')
+SENDS = metrics.Counter('gitcord_discord_sends_total', 'channel.send calls by outcome', ('outcome',))
+NOTIFICATIONS = metrics.Counter('gitcord_notifications_total', 'Notification lines by outcome', ('outcome',))
+OUTBOUND_DEPTH = metrics.Gauge('gitcord_outbound_depth', 'Notifications waiting to be sent')
+
+
+def retryable(error):
+    """
+    Whether a send that failed with `error` may succeed later: Discord rate limits,
+    server errors and connection failures, not a missing channel or permission.
+    """
+    if error is None:
+        return False
+    if isinstance(error, discord.HTTPException):
+        return error.status == 429 or error.status >= 500
+    return True
+
+
+def build_messages(lines, title="GitHub activity"):
+    """
+    Turns the notification lines of one cycle into as few message payloads
+    (kwargs for channel.send) as possible: a single line stays a plain message,
+    anything more becomes a digest of embeds. Mentions don't ping from inside an
+    embed, so each digest message repeats them in its content.
+    """
+    if len(lines) == 1 and len(lines[0]) <= MAX_CONTENT_LENGTH:
+        return [{'content': lines[0]}]
+
+    # Pack lines into embed descriptions
+    descriptions = []
+    current = ''
+    for line in lines:
+        line = line[:MAX_EMBED_DESCRIPTION]
+        if current and len(current) + 1 + len(line) > MAX_EMBED_DESCRIPTION:
+            descriptions.append(current)
+            current = ''
+        current = f"{current}\n{line}" if current else line
+    if current:
+        descriptions.append(current)
+
+    # Pack embeds into messages
+    messages = []
+    embeds, total, mentions = [], 0, []
+    for description in descriptions:
+        if embeds and (len(embeds) == MAX_EMBEDS_PER_MESSAGE or total + len(description) > MAX_EMBED_TOTAL):
+            messages.append((embeds, mentions))
+            embeds, total, mentions = [], 0, []
+        embed_title = title if not messages and not embeds else f"{title} (cont.)"
+        embeds.append(discord.Embed(title=embed_title, description=description, color=discord.Color.blurple()))
+        total += len(description) + len(embed_title)
+        mentions.extend(m for m in MENTION_RE.findall(description) if m not in mentions)
+    if embeds:
+        messages.append((embeds, mentions))
+
+    payloads = []
+    for embeds, mentions in messages:
+        content = ' '.join(mentions)
+        if len(content) > MAX_CONTENT_LENGTH:
+            content = content[:MAX_CONTENT_LENGTH].rsplit(' ', 1)[0]
+        payloads.append({'content': content or None, 'embeds': embeds})
+    return payloads
+
+
+class OutboundQueue:
+    """
+    Decouples Discord sends from event ingestion.
+
+    Notifications are collected per channel with `enqueue()` and handed over once
+    per cycle with `flush()`. Each channel has its own sender task, which coalesces
+    everything waiting for it into digest embeds and retries when Discord rate
+    limits it, so a burst of events neither floods a channel nor stalls polling.
+    `send()` hands lines over right away and tells the caller when they are sent.
+    """
+    def __init__(self, bot, max_retries=5):
+        self.bot = bot
+        self.max_retries = max_retries
+        self._pending = {} # channel_id -> lines collected this cycle
+        self._queues = {} # channel_id -> asyncio.Queue of line lists
+        self._workers = {} # channel_id -> sender task
+        self._queued = {} # channel_id -> lines handed to the sender but not sent yet
+        self.sent = 0
+        self.dropped = 0
+
+    def enqueue(self, channel_id, text):
+        self._pending.setdefault(channel_id, []).append(text)
+
+    def flush(self):
+        # End of a cycle: everything collected so far goes to the senders
+        pending, self._pending = self._pending, {}
+        for channel_id, lines in pending.items():
+            self._queued[channel_id] = self._queued.get(channel_id, 0) + len(lines)
+            self._queue_for(channel_id).put_nowait((lines, None))
+        if metrics.enabled:
+            OUTBOUND_DEPTH.set(self.total_depth())
+
+    def send(self, channel_id, lines):
+        """
+        Hands `lines` to the channel's sender right away, without waiting for flush().
+        Returns a future that resolves once the sender is done with them: to None if
+        they were sent (or the channel is gone), else to the exception it gave up on.
+        """
+        done = asyncio.get_running_loop().create_future()
+        self._queued[channel_id] = self._queued.get(channel_id, 0) + len(lines)
+        self._queue_for(channel_id).put_nowait((lines, done))
+        if metrics.enabled:
+            OUTBOUND_DEPTH.set(self.total_depth())
+        return done
+
+    def depth(self):
+        """
+        Notifications waiting per channel, collected and queued.
+        """
+        depth = {channel_id: len(lines) for channel_id, lines in self._pending.items()}
+        for channel_id, queued in self._queued.items():
+            if queued:
+                depth[channel_id] = depth.get(channel_id, 0) + queued
+        return depth
+
+    def total_depth(self):
+        return sum(self.depth().values())
+
+    def _queue_for(self, channel_id):
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = asyncio.Queue()
+        worker = self._workers.get(channel_id)
+        if worker is None or worker.done():
+            self._workers[channel_id] = asyncio.create_task(self._sender(channel_id, queue))
+        return queue
+
+    async def _sender(self, channel_id, queue):
+        while True:
+            lines, done = await queue.get()
+            lines, waiting = list(lines), [done]
+            # Coalesce whatever else piled up for this channel while we were sending
+            while not queue.empty():
+                more, done = queue.get_nowait()
+                lines.extend(more)
+                waiting.append(done)
+                queue.task_done()
+            try:
+                await self._deliver(channel_id, lines)
+                self._resolve(waiting, None)
+            except Exception as e:
+                self.dropped += len(lines)
+                NOTIFICATIONS.inc('dropped', amount=len(lines))
+                logging.error(f"Failed to send {len(lines)} notifications to channel {channel_id}: {e}")
+                self._resolve(waiting, e)
+            finally:
+                self._queued[channel_id] -= len(lines)
+                queue.task_done()
+                if metrics.enabled:
+                    OUTBOUND_DEPTH.set(self.total_depth())
+
+    def _resolve(self, waiting, error):
+        for done in waiting:
+            if done is not None and not done.done():
+                done.set_result(error)
+
+    async def _deliver(self, channel_id, lines):
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            self.dropped += len(lines)
+            NOTIFICATIONS.inc('dropped', amount=len(lines))
+            logging.warning(f"Channel {channel_id} not found, dropped {len(lines)} notifications")
+            return
+
+        for payload in build_messages(lines):
+            await self._send_with_retry(channel, payload)
+        self.sent += len(lines)
+        NOTIFICATIONS.inc('sent', amount=len(lines))
+
+    async def _send_with_retry(self, channel, payload):
+        for attempt in range(self.max_retries):
+            try:
+                with SEND_SECONDS.time():
+                    message = await channel.send(**payload)
+                SENDS.inc('ok')
+                return message
+            except (discord.Forbidden, discord.NotFound):
+                SENDS.inc('failed')
+                raise
+            except discord.HTTPException as e:
+                if attempt == self.max_retries - 1 or not retryable(e):
+                    SENDS.inc('failed')
+                    raise
+                SENDS.inc('retried')
+                retry_after = getattr(e, 'retry_after', None)
+                if retry_after is None and e.response is not None:
+                    retry_after = float(e.response.headers.get('Retry-After', 0) or 0)
+                delay = retry_after or 2 ** attempt
+                logging.warning(f"Send to channel {channel.id} failed ({e.status}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def close(self, timeout=10):
+        # Give the senders a chance to drain, then stop them
+        self.flush()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues.values())), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Outbound queue closed with {self.total_depth()} notifications unsent")
+        for worker in self._workers.values():
+            worker.cancel()
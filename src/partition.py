@@ -0,0 +1,64 @@
+import hashlib
+import logging
+import time
+from database import heartbeat_worker, get_live_workers, run_write
+
+
+def _weight(worker_id, repo_key):
+    return hashlib.blake2b(f"{worker_id}\0{repo_key}".encode(), digest_size=8).digest()
+
+
+def repo_owner(repo_key, workers):
+    """
+    Rendezvous (highest random weight) hashing: the worker with the highest hash of
+    (worker, repo) owns the repo. When a worker joins or leaves, only the repos it
+    gains or had move; every other repo keeps its owner.
+    """
+    if not workers:
+        return None
+    return max(workers, key=lambda worker_id: _weight(worker_id, repo_key))
+
+
+class RepoPartition:
+    """
+    This worker's share of the repos table, among the workers whose heartbeat
+    in the `workers` table is younger than `ttl` seconds.
+
+    Every worker recomputes ownership from the same membership, so there is
+    nothing to coordinate beyond the heartbeats. A worker that stopped cleanly
+    leaves right away (remove_worker), one that died after `ttl`. Workers notice
+    a change at their next heartbeat, so a repo that changes hands is only picked
+    up by its new owner `grace` seconds later, once the old one has let go of it.
+    """
+    def __init__(self, worker_id, ttl=60, grace=30):
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.grace = grace
+        self.members = None
+        self.previous = []
+        self.changed_at = 0
+
+    async def heartbeat(self):
+        """
+        Refreshes this worker's heartbeat and the membership. Returns True if it changed.
+        """
+        await run_write(heartbeat_worker, self.worker_id)
+        now = time.time()
+        members = get_live_workers(now - self.ttl)
+        if members == self.members:
+            return False
+
+        # On the first heartbeat the others don't know about this worker yet
+        self.previous = self.members if self.members is not None else [w for w in members if w != self.worker_id]
+        self.members = members
+        self.changed_at = now
+        logging.info(f"Worker {self.worker_id}: {len(members)} worker(s) live ({', '.join(members)}), rebalancing")
+        return True
+
+    def owns(self, repo_key):
+        if repo_owner(repo_key, self.members) != self.worker_id:
+            return False
+        if time.time() - self.changed_at >= self.grace:
+            return True
+        # Still settling: only repos this worker already had, or that nobody had
+        return repo_owner(repo_key, self.previous) in (self.worker_id, None)
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+import metrics
+from database import update_repo_poll_states, get_feed_state, update_feed_state, mark_in_org_feed, run_write
+
+POLL_CYCLE_SECONDS = metrics.Histogram('gitcord_poll_cycle_seconds', 'Duration of a polling pass', ('feed',))
+POLLED_EVENTS = metrics.Counter('gitcord_polled_events_total', 'New events found by polling', ('feed',))
+POLL_FAILURES = metrics.Counter('gitcord_poll_failures_total', 'Repos or feeds that failed to poll', ('feed',))
+
+
+def next_poll_interval(current, new_events, github_interval, min_interval, max_interval):
+    """
+    Adaptive cadence: halve the interval while a repo is active, back off by 1.5x
+    while it is quiet. Never polls faster than GitHub's X-Poll-Interval.
+    """
+    floor = max(min_interval, github_interval or 0)
+    if current is None:
+        current = floor
+    interval = current / 2 if new_events else current * 1.5
+    return int(min(max(interval, floor), max(max_interval, floor)))
+
+
+def group_subscriptions(repo_rows):
+    """
+    Groups `repos` rows by owner/name (case-insensitive): one entry per repo
+    to fetch, holding every channel subscription of it.
+    """
+    groups = {}
+    for row in repo_rows:
+        key = f"{row['owner']}/{row['name']}".lower()
+        groups.setdefault(key, []).append(row)
+    return groups
+
+
+class RepoPollState:
+    """
+    Where polling of one repo resumes after a fetch. With new events it is handed to
+    `handle_events` and saved in the same transaction as the page (EventBatch.poll_state),
+    so an active repo costs one commit per poll; quiet ones are saved together per cycle.
+    """
+    __slots__ = ('repo_ids', 'etag', 'interval', 'last_event_id', 'previous_event_id', 'retry_interval')
+
+    def __init__(self, repo_ids, etag, interval, last_event_id, previous_event_id=None, retry_interval=None):
+        self.repo_ids = repo_ids
+        self.etag = etag
+        self.interval = interval
+        self.last_event_id = last_event_id
+        self.previous_event_id = previous_event_id
+        self.retry_interval = retry_interval or interval
+
+    def row(self):
+        return (self.repo_ids, self.etag, self.interval, time.time() + self.interval, self.last_event_id)
+
+    def failed_row(self):
+        # Some events failed: the watermark stays where it was and the ETag is dropped, so they
+        # are fetched again, after a backoff that doubles with each failing poll
+        return (self.repo_ids, None, self.retry_interval, time.time() + self.retry_interval, self.previous_event_id)
+
+
+class RepoPoller:
+    """
+    Polls many repositories at once, with at most `concurrency` GitHub requests in flight.
+
+    Each repo is fetched once per cycle no matter how many channels it is linked to,
+    then handed to `handle_events` with all of its subscriptions inside its own task,
+    so one repo's events are always processed in order, while a cycle takes
+    roughly as long as the slowest repo instead of the sum of all of them.
+
+    Every repo also keeps its own next poll time in the `repos` table: busy repos
+    are polled more often, dormant ones back off, so callers only pass in the
+    repos that are due.
+    """
+    def __init__(self, gh_client, concurrency=10, min_interval=60, max_interval=1800):
+        self.gh_client = gh_client
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.last_cycle = None
+
+    async def run_cycle(self, repos, handle_events):
+        """
+        Polls every repo in `repos` (rows of the `repos` table) and awaits
+        `handle_events(subscriptions, events, poll_state)` once per distinct owner/name
+        with new events, which returns how many events were new and commits the
+        RepoPollState with the page (RepoPollState.failed_row() if some events failed).
+        Returns a dict of cycle stats, also kept in `self.last_cycle`.
+        """
+        start = time.monotonic()
+        groups = group_subscriptions(repos)
+        quiet = []
+        results = await asyncio.gather(
+            *(self._poll_repo(subscriptions, handle_events, quiet) for subscriptions in groups.values()),
+            return_exceptions=True
+        )
+        if quiet:
+            await run_write(update_repo_poll_states, [state.row() for state in quiet])
+
+        failed = 0
+        events_seen = 0
+        for key, result in zip(groups, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logging.error(f"Polling {key} failed: {result}")
+            else:
+                events_seen += result
+
+        stats = {
+            'repos': len(groups),
+            'subscriptions': len(repos),
+            'failed': failed,
+            'events': events_seen,
+            'duration': time.monotonic() - start
+        }
+        self.last_cycle = stats
+        POLL_CYCLE_SECONDS.observe(stats['duration'], 'repos')
+        POLLED_EVENTS.inc('repos', amount=events_seen)
+        POLL_FAILURES.inc('repos', amount=failed)
+        logging.info(
+            f"Poll cycle: {stats['repos']} repos ({stats['subscriptions']} subscriptions), "
+            f"{stats['events']} events, {stats['failed']} failed in {stats['duration']:.2f}s"
+        )
+        return stats
+
+    async def _poll_repo(self, subscriptions, handle_events, quiet):
+        first = subscriptions[0]
+        # Rows of one repo share their ETag once polled together; if they disagree, fetch fresh
+        etags = {row['last_event_etag'] for row in subscriptions}
+        etag = etags.pop() if len(etags) == 1 else None
+        intervals = [row['poll_interval'] for row in subscriptions if row['poll_interval']]
+        # Oldest watermark of the group, so no subscription misses events
+        watermarks = [int(row['last_event_id']) for row in subscriptions if row['last_event_id']]
+        since_id = min(watermarks) if watermarks else None
+
+        # Only the network round trip holds a slot; processing doesn't block other fetches
+        async with self.semaphore:
+            events, new_etag, github_interval = await self.gh_client.get_repo_events(
+                first['owner'], first['name'], etag, since_id
+            )
+        # Everything fetched is past the watermark, so any event means the repo is active
+        current = min(intervals) if intervals else None
+        interval = next_poll_interval(current, len(events), github_interval, self.min_interval, self.max_interval)
+        floor = max(self.min_interval, github_interval or 0)
+        retry_interval = int(min(max((current or floor) * 2, floor), max(self.max_interval, floor)))
+        previous_id = str(since_id) if since_id is not None else None
+        if events:
+            since_id = max(int(event.id) for event in events)
+        state = RepoPollState([row['id'] for row in subscriptions], new_etag, interval,
+                              str(since_id) if since_id is not None else None,
+                              previous_event_id=previous_id, retry_interval=retry_interval)
+        if not events:
+            quiet.append(state)
+            return 0
+        return await handle_events(subscriptions, events, state)
+
+
+class OrgEventStream:
+    """
+    Ingests every linked repo of the organization from the single `/orgs/{org}/events`
+    feed instead of one request per repo.
+
+    Events are routed by `event.repo` to the subscriptions of that repo,
+    through an index rebuilt from the `repos` table on every poll. Repos outside the
+    org, and private repos, which the org feed doesn't list, still need per-repo polling:
+    a repo of the org only counts as covered while the feed has returned one of its
+    events within the last `seen_ttl` seconds (`repos.org_feed_seen_at`). Otherwise, e.g.
+    once a repo went private, it is polled per repo again, paging back to its own
+    watermark, and the processed markers keep events from being handled twice.
+    """
+    def __init__(self, gh_client, min_interval=60, max_interval=300, seen_ttl=3600):
+        self.gh_client = gh_client
+        self.org = gh_client.org_name.lower()
+        self.feed = f"org:{self.org}"
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.seen_ttl = seen_ttl
+        self.last_cycle = None
+
+    def in_org(self, repo_row):
+        return repo_row['owner'].lower() == self.org
+
+    def covers(self, repo_row):
+        # Whether per-repo polling can be skipped for this repo
+        seen_at = repo_row['org_feed_seen_at']
+        return self.in_org(repo_row) and seen_at is not None and seen_at > time.time() - self.seen_ttl
+
+    async def poll(self, repos, handle_events):
+        """
+        Polls the org feed if it is due and awaits `handle_events(subscriptions, events)`
+        for each linked repo that had events. Returns the number of new events, or None
+        if the feed wasn't due yet.
+        """
+        state = get_feed_state(self.feed)
+        if state and state['next_poll_at'] and state['next_poll_at'] > time.time():
+            return None
+
+        start = time.monotonic()
+        etag = state['etag'] if state else None
+        since_id = state['last_event_id'] if state else None
+        events, new_etag, github_interval = await self.gh_client.get_org_events(etag, since_id)
+
+        # Routing index: owner/name -> subscriptions, only for repos of this org
+        routes = group_subscriptions(row for row in repos if self.in_org(row))
+        routed = {}
+        for event in events:
+            key = event.repo.lower()
+            if key in routes:
+                routed.setdefault(key, []).append(event)
+        if routed:
+            await run_write(mark_in_org_feed, list(routed), time.time())
+
+        # Repos are independent, but each one's events stay in order inside its own task
+        results = await asyncio.gather(
+            *(handle_events(routes[key], repo_events) for key, repo_events in routed.items()),
+            return_exceptions=True
+        )
+        new_events = 0
+        failed = False
+        for key, result in zip(routed, results):
+            if isinstance(result, Exception):
+                failed = True
+                logging.error(f"Handling org events for {key} failed: {result}")
+            else:
+                new_events += result
+        if failed:
+            POLL_FAILURES.inc('org')
+            # Leave the feed state alone so the same events are fetched again next tick
+            return new_events
+
+        interval = next_poll_interval(
+            state['poll_interval'] if state else None, new_events, github_interval,
+            self.min_interval, self.max_interval
+        )
+        if events:
+            since_id = max(int(event.id) for event in events)
+        await run_write(update_feed_state, self.feed, new_etag, interval, time.time() + interval,
+                        str(since_id) if since_id is not None else None)
+
+        self.last_cycle = {
+            'events': len(events),
+            'routed_repos': len(routed),
+            'new_events': new_events,
+            'duration': time.monotonic() - start
+        }
+        POLL_CYCLE_SECONDS.observe(self.last_cycle['duration'], 'org')
+        POLLED_EVENTS.inc('org', amount=new_events)
+        logging.info(
+            f"Org stream {self.org}: {len(events)} events for {len(routed)} linked repos, "
+            f"{new_events} new in {self.last_cycle['duration']:.2f}s"
+        )
+        return new_events
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import discord
+from database import get_all_users, get_scores
+
+
+class PromotionEngine:
+    """
+    Keeps score-based roles (e.g. Contributor, Maintainer) in line with users.score.
+
+    Roles are tiers: a user holds the role of the highest threshold they reached and
+    none of the lower ones. Only users whose score changed are checked, and only
+    when they cross a threshold is a role edit queued. Edits are applied by one
+    background task, spaced `interval` seconds apart to stay under Discord's rate
+    limits. Only tier roles are removed or added, so other roles a member gained
+    meanwhile are kept. `reconcile()` checks every linked
+    user, for recovery after downtime or a threshold change.
+    """
+    def __init__(self, bot, guild_id, thresholds, interval=1.0):
+        self.bot = bot
+        self.guild_id = guild_id
+        # [(min_score, role_name)], lowest first
+        self.tiers = sorted((score, name) for name, score in thresholds.items())
+        self.interval = interval
+        self._pending = {} # discord_id -> target role name (None = no tier role)
+        self._worker = None
+        self.applied = 0
+
+    def target_role(self, score):
+        role = None
+        for min_score, name in self.tiers:
+            if score >= min_score:
+                role = name
+        return role
+
+    def on_scores_applied(self, deltas):
+        """
+        Called with the {discord_id: points} a score flush just applied.
+        Queues a role edit for each user who crossed a threshold.
+        """
+        if not self.tiers or not deltas:
+            return
+        new_scores = get_scores(deltas)
+        for discord_id, new_score in new_scores.items():
+            old_role = self.target_role(new_score - deltas[discord_id])
+            new_role = self.target_role(new_score)
+            if old_role != new_role:
+                self._queue(discord_id, new_role)
+
+    def _queue(self, discord_id, role_name):
+        self._pending[discord_id] = role_name
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._apply_pending())
+
+    def pending(self):
+        return len(self._pending)
+
+    async def _apply_pending(self):
+        # Scores can be applied before the first on_ready (cogs load in setup_hook), when no guild is cached yet
+        await self.bot.wait_until_ready()
+        guild = self.bot.get_guild(self.guild_id)
+        if guild is None:
+            logging.error(f"Promotion engine: guild {self.guild_id} not found, {len(self._pending)} role edits skipped")
+            self._pending.clear()
+            return
+
+        tier_roles = {}
+        for _, name in self.tiers:
+            role = discord.utils.get(guild.roles, name=name)
+            if role:
+                tier_roles[name] = role
+            else:
+                logging.warning(f"Promotion engine: role '{name}' doesn't exist in the server")
+        while self._pending:
+            discord_id, role_name = self._pending.popitem()
+            try:
+                if await self._set_tier(guild, tier_roles, discord_id, role_name):
+                    await asyncio.sleep(self.interval)
+            except Exception as e:
+                logging.error(f"Failed to update roles for {discord_id}: {e}")
+
+    async def _set_tier(self, guild, tier_roles, discord_id, role_name):
+        # Returns True if an API call was made
+        member = guild.get_member(discord_id)
+        if member is None:
+            return False
+
+        if role_name and role_name not in tier_roles:
+            return False
+        wanted = tier_roles.get(role_name)
+        # Only tier roles are touched, so roles changed by admins or other bots meanwhile are kept
+        stale = [role for role in member.roles if role in tier_roles.values() and role != wanted]
+        missing = wanted is not None and wanted not in member.roles
+        if not stale and not missing:
+            return False
+
+        reason = f"GitCord score tier: {role_name or 'none'}"
+        if stale:
+            await member.remove_roles(*stale, reason=reason)
+        if missing:
+            await member.add_roles(wanted, reason=reason)
+        self.applied += 1
+        return True
+
+    async def reconcile(self):
+        """
+        Queues a tier check for every linked user and waits until they are applied.
+        Returns the number of users checked.
+        """
+        users = get_all_users()
+        for user in users:
+            self._pending[user['discord_id']] = self.target_role(user['score'])
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._apply_pending())
+        await self._worker
+        return len(users)
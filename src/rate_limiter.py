@@ -0,0 +1,203 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import metrics
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+RESOURCES = ('core', 'search', 'graphql')
+
+# GitHub asks to wait at least a minute after a secondary rate limit without Retry-After
+SECONDARY_LIMIT_BACKOFF = 60
+MAX_SECONDARY_LIMIT_BACKOFF = 15 * 60
+
+RATE_LIMIT_REMAINING = metrics.Gauge('gitcord_github_rate_limit_remaining', 'Requests left in the current rate-limit window', ('resource',))
+RATE_LIMITED = metrics.Counter('gitcord_github_rate_limited_total', 'Responses that hit a rate limit', ('resource',))
+
+
+class _Budget:
+    """
+    State of one GitHub rate-limit bucket, as last reported by the X-RateLimit-* headers.
+    """
+    def __init__(self, name, reserve_ratio, pace_ratio):
+        self.name = name
+        self.limit = None
+        self.remaining = None
+        self.reset_at = 0.0 # Epoch seconds, as in X-RateLimit-Reset
+        self.blocked_until = 0.0
+        self.secondary_backoff = SECONDARY_LIMIT_BACKOFF
+        self.reserve_ratio = reserve_ratio
+        self.pace_ratio = pace_ratio
+        self.next_background_at = 0.0
+        self.waiters = [] # heap of (priority, seq, future)
+        self.wakeup = asyncio.Event()
+        self.dispatcher = None
+
+    def _reserve(self):
+        return int(self.limit * self.reserve_ratio) if self.limit else 0
+
+    def delay_for(self, priority, now):
+        """
+        Seconds a request of this priority has to wait before it may be sent.
+        """
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        if self.remaining is None:
+            return 0
+
+        if now >= self.reset_at:
+            # Window rolled over; the next response tells us the new numbers
+            self.remaining = None
+            return 0
+
+        # Background work leaves a reserve for interactive requests like /link
+        floor = 0 if priority <= PRIORITY_INTERACTIVE else self._reserve()
+        if self.remaining <= floor:
+            return self.reset_at - now
+
+        if priority > PRIORITY_INTERACTIVE and self.next_background_at > now:
+            return self.next_background_at - now
+        return 0
+
+    def take(self, priority, now):
+        if self.remaining is None:
+            return
+        self.remaining -= 1
+
+        # Once the budget runs low, spread the rest of it evenly until the reset
+        if priority > PRIORITY_INTERACTIVE and self.limit and self.remaining < self.limit * self.pace_ratio:
+            spendable = max(self.remaining - self._reserve(), 1)
+            self.next_background_at = now + (self.reset_at - now) / spendable
+
+
+class RateLimitScheduler:
+    """
+    Central gate for every GitHub request, with one budget per rate-limit resource
+    (core REST, search, GraphQL).
+
+    Callers `await acquire(resource, priority)` before sending and report the
+    response with `update()`. Waiting requests are released in priority order,
+    background work is paced when a budget runs low and held back entirely once it
+    is exhausted or GitHub asked us to back off, instead of sending requests that
+    would only fail.
+    """
+    def __init__(self, reserve_ratio=0.05, pace_ratio=0.25):
+        self.budgets = {name: _Budget(name, reserve_ratio, pace_ratio) for name in RESOURCES}
+        self._seq = itertools.count()
+
+    async def acquire(self, resource, priority=PRIORITY_BACKGROUND, timeout=None):
+        """
+        Waits until a request against `resource` may be sent.
+        Raises asyncio.TimeoutError if that takes longer than `timeout` seconds.
+        """
+        budget = self.budgets[resource]
+        now = time.time()
+        if not budget.waiters and budget.delay_for(priority, now) == 0:
+            budget.take(priority, now)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(budget.waiters, (priority, next(self._seq), future))
+        budget.wakeup.set()
+        if budget.dispatcher is None or budget.dispatcher.done():
+            budget.dispatcher = asyncio.create_task(self._dispatch(budget))
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def _dispatch(self, budget):
+        while budget.waiters:
+            priority, _, future = budget.waiters[0]
+            if future.done():
+                heapq.heappop(budget.waiters)
+                continue
+
+            now = time.time()
+            delay = budget.delay_for(priority, now)
+            if delay > 0:
+                # Sleep until the budget frees up, or a new (maybe higher priority) waiter arrives
+                budget.wakeup.clear()
+                try:
+                    await asyncio.wait_for(budget.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(budget.waiters)
+            budget.take(priority, now)
+            future.set_result(None)
+
+    def update(self, resource, status, headers, message=''):
+        """
+        Records the rate-limit headers of a response.
+        Returns how many seconds to wait before retrying if the request was rate limited, else 0.
+        """
+        budget = self.budgets[resource]
+        now = time.time()
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        limit = headers.get('X-RateLimit-Limit')
+        if limit is not None:
+            budget.limit = int(limit)
+        if remaining is not None:
+            remaining = int(remaining)
+        if remaining is not None and reset is not None:
+            reset = float(reset)
+            if reset != budget.reset_at or budget.remaining is None:
+                budget.reset_at = reset
+                budget.remaining = remaining
+            else:
+                # Responses to concurrent requests can arrive out of order
+                budget.remaining = min(budget.remaining, remaining)
+            RATE_LIMIT_REMAINING.set(budget.remaining, resource)
+
+        if status not in (403, 429):
+            budget.secondary_backoff = SECONDARY_LIMIT_BACKOFF
+            return 0
+
+        retry_after = headers.get('Retry-After')
+        if retry_after is not None:
+            delay = float(retry_after)
+        elif remaining == 0 and budget.reset_at > now:
+            delay = max(budget.reset_at - now, 1)
+        elif remaining == 0 or 'rate limit' in message.lower():
+            # Secondary rate limit without a Retry-After, or an exhausted budget without a
+            # (current) reset time: back off exponentially
+            delay = budget.secondary_backoff
+            budget.secondary_backoff = min(budget.secondary_backoff * 2, MAX_SECONDARY_LIMIT_BACKOFF)
+        else:
+            return 0 # A plain 403 (permissions), not a rate limit
+
+        budget.blocked_until = max(budget.blocked_until, now + delay)
+        budget.wakeup.set()
+        RATE_LIMITED.inc(resource)
+        logging.warning(f"GitHub {resource} rate limit hit, holding requests for {delay:.0f}s")
+        return delay
+
+    def snapshot(self):
+        """
+        Current view of every budget, for logging and admin commands.
+        """
+        now = time.time()
+        return {
+            name: {
+                'limit': b.limit,
+                'remaining': b.remaining,
+                'resets_in': max(b.reset_at - now, 0) if b.reset_at else None,
+                'blocked_for': max(b.blocked_until - now, 0),
+                'waiting': sum(1 for _, _, f in b.waiters if not f.done())
+            }
+            for name, b in self.budgets.items()
+        }
@@ -0,0 +1,40 @@
+"""
+Replays a recorded GitHub webhook payload against a local GitCord webhook endpoint,
+signed the same way GitHub signs deliveries.
+
+Usage:
+    python src/replay_webhook.py <payload.json> --event pull_request --secret <secret>
+        [--url http://127.0.0.1:8080/github/webhook] [--delivery <id>]
+
+Reusing the same --delivery ID checks that duplicates are ignored.
+"""
+import argparse
+import uuid
+import requests
+from webhooks import sign_payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a signed webhook payload to a local GitCord endpoint")
+    parser.add_argument('payload', help="JSON file with the webhook body")
+    parser.add_argument('--event', required=True, help="X-GitHub-Event, e.g. issues, pull_request, pull_request_review")
+    parser.add_argument('--secret', required=True, help="webhooks.secret from config.yaml")
+    parser.add_argument('--url', default='http://127.0.0.1:8080/github/webhook')
+    parser.add_argument('--delivery', default=None, help="X-GitHub-Delivery (random if omitted)")
+    args = parser.parse_args()
+
+    with open(args.payload, 'rb') as f:
+        body = f.read()
+
+    headers = {
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': args.event,
+        'X-GitHub-Delivery': args.delivery or str(uuid.uuid4()),
+        'X-Hub-Signature-256': sign_payload(args.secret, body)
+    }
+    response = requests.post(args.url, data=body, headers=headers, timeout=10)
+    print(f"{response.status_code} {response.text} (delivery {headers['X-GitHub-Delivery']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import logging
+from database import apply_awards, get_unapplied_awards, run_write
+
+
+class ScoreAggregator:
+    """
+    Write-behind scoring on top of the activity_log journal.
+
+    Awards are first journalled (idempotently, keyed by event and activity) in the
+    same transaction as the page's processed markers. The aggregator then sums the
+    new awards per user in memory and applies them to users.score in one batch
+    transaction per flush, flagging their journal rows as applied. What is added is
+    computed from the rows still unapplied at that point, so an award that reached
+    the aggregator twice is applied once. After a crash, `recover()` re-applies
+    whatever the journal still holds as unapplied.
+    """
+    def __init__(self):
+        self._activity_ids = []
+        self._deltas = {} # discord_id -> points not yet in users.score
+
+    def add(self, journalled):
+        # `journalled` as returned by commit_event_batch(): (activity_id, discord_id, points)
+        for activity_id, discord_id, points in journalled:
+            self._activity_ids.append(activity_id)
+            self._deltas[discord_id] = self._deltas.get(discord_id, 0) + points
+
+    def pending(self):
+        return dict(self._deltas)
+
+    async def flush(self):
+        """
+        Applies the pending awards. Returns {discord_id: points} that were applied.
+        """
+        if not self._activity_ids:
+            return {}
+        activity_ids, deltas = self._activity_ids, self._deltas
+        self._activity_ids, self._deltas = [], {}
+        try:
+            return await run_write(apply_awards, activity_ids)
+        except Exception:
+            # Still unapplied in the journal; keep them for the next flush
+            self._activity_ids = activity_ids + self._activity_ids
+            for discord_id, points in deltas.items():
+                self._deltas[discord_id] = self._deltas.get(discord_id, 0) + points
+            raise
+
+    def collect(self):
+        """
+        Adds unapplied journal rows written by other processes (ingestion workers)
+        that aren't pending here yet. Returns how many were added.
+        """
+        pending = set(self._activity_ids)
+        rows = [row for row in get_unapplied_awards() if row['id'] not in pending]
+        self.add((row['id'], row['discord_id'], row['points'] or 0) for row in rows)
+        return len(rows)
+
+    async def recover(self):
+        """
+        Applies journal rows left unapplied by a previous run. Call once at startup,
+        before anything new is added. Returns {discord_id: points} that were applied, like flush().
+        """
+        rows = get_unapplied_awards()
+        if not rows:
+            return {}
+        self.add((row['id'], row['discord_id'], row['points'] or 0) for row in rows)
+        applied = await self.flush()
+        logging.info(f"Applied {len(rows)} journalled awards left over from the last run")
+        return applied
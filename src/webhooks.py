@@ -0,0 +1,98 @@
+import hashlib
+import hmac
+import json
+import logging
+from aiohttp import web
+from event_records import EventRecord
+
+# Webhook event name (X-GitHub-Event) -> Events API type, for the events process_event handles
+WEBHOOK_EVENT_TYPES = {
+    'issues': 'IssuesEvent',
+    'pull_request': 'PullRequestEvent',
+    'pull_request_review': 'PullRequestReviewEvent'
+}
+
+
+def verify_signature(secret, body, signature):
+    """
+    Checks X-Hub-Signature-256 ("sha256=<hex HMAC of the raw body>") in constant time.
+    """
+    if not signature:
+        return False
+    expected = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def sign_payload(secret, body):
+    # Same header value GitHub sends, used by the local replayer
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def webhook_to_event(event_name, payload):
+    """
+    Reshapes a webhook delivery into an Events API event (as an EventRecord), so it
+    can go through the same process_event pipeline as polled events. Returns None
+    for event types the bot doesn't handle.
+    """
+    etype = WEBHOOK_EVENT_TYPES.get(event_name)
+    if not etype or 'repository' not in payload:
+        return None
+    return EventRecord.from_api({
+        'id': None, # Webhooks carry no Events API ID; dedupe uses event_key() instead
+        'type': etype,
+        'actor': {'login': payload['sender']['login']},
+        'repo': {'name': payload['repository']['full_name']},
+        'payload': payload
+    })
+
+
+class WebhookServer:
+    """
+    Minimal HTTP endpoint receiving GitHub webhook deliveries, as a push-based
+    alternative to polling.
+
+    Deliveries with a missing or wrong X-Hub-Signature-256 are rejected. Valid ones
+    are handed to `on_delivery(event_name, delivery_id, payload)`, which returns
+    False for a delivery it has already seen (X-GitHub-Delivery). GitHub expects an
+    answer within 10 seconds, so `on_delivery` should only queue the work.
+    """
+    def __init__(self, secret, on_delivery, host='127.0.0.1', port=8080, path='/github/webhook'):
+        self.secret = secret
+        self.on_delivery = on_delivery
+        self.host = host
+        self.port = port
+        self.path = path
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"Webhook endpoint listening on http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request):
+        body = await request.read()
+        if not verify_signature(self.secret, body, request.headers.get('X-Hub-Signature-256')):
+            logging.warning("Rejected webhook delivery with an invalid signature")
+            return web.Response(status=401, text="invalid signature")
+
+        event_name = request.headers.get('X-GitHub-Event', '')
+        delivery_id = request.headers.get('X-GitHub-Delivery', '')
+        if event_name == 'ping':
+            return web.Response(text="pong")
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400, text="invalid JSON")
+
+        if not await self.on_delivery(event_name, delivery_id, payload):
+            return web.Response(text="duplicate delivery")
+        return web.Response(status=202, text="accepted")
@@ -0,0 +1,95 @@
+"""
+Ingestion worker: polls its share of the linked repos (see partition.py) and queues
+the notifications in the outbox table, for the bot process to post. Scores are
+journalled and applied by the bot as well. Start any number of them next to a bot
+running with `ingestion.workers: true`; they share the bot's database and config.yaml.
+
+    python src/worker.py --id worker-1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+from config import config, found as config_found
+from github_client import AsyncGitHubClient
+from database import init_db, close_db, remove_worker, run_write
+import metrics
+from cogs.events import Events
+
+
+class WorkerHost:
+    """
+    The part of the bot the Events cog uses when it only ingests: the GitHub client.
+    There is no gateway connection, so it is ready right away and has no channels.
+    """
+    def __init__(self, gh_client):
+        self.gh_client = gh_client
+
+    def get_channel(self, channel_id):
+        return None
+
+    def get_cog(self, name):
+        return None
+
+    async def wait_until_ready(self):
+        return
+
+
+async def run_worker(worker_id, metrics_port=None):
+    init_db()
+    metrics_server = None
+    if metrics_port:
+        metrics.enable()
+        metrics_server = metrics.MetricsServer(port=metrics_port)
+        await metrics_server.start()
+
+    gh_client = AsyncGitHubClient(
+        config['github']['token'],
+        config['github']['organization'],
+        timeout=config['github'].get('timeout', 10),
+        pool_size=config['github'].get('pool_size', 20)
+    )
+    events = Events(WorkerHost(gh_client), worker_id=worker_id)
+    logging.info(f"Worker {worker_id} started")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    # Let the current cycle finish, so its page commits land before the repos move on
+    events.sync_events.stop()
+    while events.sync_events.is_running():
+        await asyncio.sleep(0.1)
+    events.heartbeat.cancel()
+    await run_write(remove_worker, worker_id)
+    await gh_client.close()
+    if metrics_server:
+        await metrics_server.stop()
+    close_db()
+    logging.info(f"Worker {worker_id} stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a GitCord ingestion worker")
+    parser.add_argument('--id', default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="unique name of this worker (default: host and pid)")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port")
+    args = parser.parse_args()
+
+    if not config_found:
+        print("config.yaml not found!")
+        sys.exit(1)
+    if not config.get('ingestion', {}).get('workers', False):
+        print("⚠️ ingestion.workers is not enabled in config.yaml; the bot will keep polling too")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    asyncio.run(run_worker(args.id, args.metrics_port))
+
+
+if __name__ == '__main__':
+    main()